@@ -1,6 +1,7 @@
-from typing import Literal
+from typing import Literal, List, Optional
 
 from app.services import query_app_templates
+from app.services.app_template_catalog import app_template_catalog
 from app.services.ds_platform import ds_client
 from app.config.settings import settings
 from app.utils.logger import logger
@@ -40,14 +41,12 @@ class ApptemplateQueryAgent:
     """
 
     @classmethod
-    async def query_app_templates(cls, meta, appName: str) -> str:
+    async def extract_keys(cls, meta, appName: str) -> str:
         """
-        查询应用模板
+        拆分应用名称关键词
         :param appName: 应用名称
-        :return: 应用模板集合
+        :return: 关键词，以逗号分隔
         """
-
-        # 1.识别关键词
         prompt = cls.APP_TEMPLATE_QUERY_KEYS_PROMPT_TEMPLATE.format(appName=appName)
 
         try:
@@ -56,7 +55,8 @@ class ApptemplateQueryAgent:
                 chatId=meta.chatId,
                 prompt=prompt,
                 stream=False,
-                temperature=0.0  # 意图识别用极低温度保证准确性
+                temperature=0.0,  # 意图识别用极低温度保证准确性
+                hedge=True  # 短小幂等调用，慢请求时发起对冲
             )
 
             keys = response["content"].strip().lower()
@@ -64,10 +64,43 @@ class ApptemplateQueryAgent:
 
             if keys == "":
                 raise IntentRecognitionError(f"无效的应用名称关键词识别结果：{keys}")
+            return keys
         except Exception as e:
             logger.error(f"应用模板查询失败：{str(e)}", exc_info=True)
             raise IntentRecognitionError(f"应用模板查询失败：{str(e)}")
-        # 2.查询应用模板
+
+    @classmethod
+    async def query_app_templates(cls, meta, appName: str, keywords: Optional[List[str]] = None) -> str:
+        """
+        查询应用模板
+        :param appName: 应用名称
+        :param keywords: 已提取的关键词（非空时不再调用LLM拆分关键词）
+        :return: 应用模板集合
+        """
+
+        # 1.优先从本地模板目录检索：先用应用名称的n-gram检索，未命中再用LLM拆分的关键词检索
+        #   目录未加载或均未命中时回退到实时接口
+        if settings.APP_TEMPLATE_CATALOG_ENABLED:
+            app_templates = await app_template_catalog.search(meta=meta, app_name=appName, keywords=keywords or [])
+            if app_templates is None:
+                logger.info(f"应用模板目录未加载：{appName}，回退到实时接口")
+            elif app_templates:
+                logger.info(f"应用模板目录命中：{appName}，匹配模板数：{len(app_templates)}")
+                return app_templates
+            elif not keywords:
+                keys = await cls.extract_keys(meta, appName)
+                keywords = [key.strip() for key in keys.replace("，", ",").split(",") if key.strip()]
+                app_templates = await app_template_catalog.search(meta=meta, app_name=appName, keywords=keywords)
+                if app_templates:
+                    logger.info(f"应用模板目录按关键词命中：{appName}，匹配模板数：{len(app_templates)}")
+                    return app_templates
+        else:
+            # 2.未启用目录时识别关键词（已提供关键词时直接使用）
+            if keywords:
+                logger.info(f"应用名称{appName}使用已提取的关键词：{','.join(keywords)}")
+            else:
+                await cls.extract_keys(meta, appName)
+        # 3.查询应用模板（目录未命中时以实时接口结果为准）
         try:
             response = await query_app_templates.call_app_template_query(
                 # name_clues=keys,
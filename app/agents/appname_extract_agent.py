@@ -42,7 +42,8 @@ class AppNameExtractAgent:
                 chatId=chatId,
                 prompt=prompt,
                 stream=False,
-                temperature=0.0  # 意图识别用极低温度保证准确性
+                temperature=0.0,  # 意图识别用极低温度保证准确性
+                hedge=True  # 短小幂等调用，慢请求时发起对冲
             )
 
             appName = response["content"].strip().lower()
@@ -1,12 +1,15 @@
 # app/agents/executor_agent.py
-from typing import Optional, Dict, Any
+import asyncio
+from typing import Optional, Dict, Any, List
 
 from langchain_core.messages import SystemMessage, AIMessage
 from langgraph.constants import END
-from langgraph.graph import add_messages
 
+from app.agents.form_build_agent import form_build_agent
+from app.config.settings import settings
 from app.models.state import LCAIState, Task
 from app.utils.logger import logger
+from app.utils.website import get_app_run_url
 
 
 class ExecutorAgent:
@@ -19,18 +22,58 @@ class ExecutorAgent:
             "human_confirm": "human_confirm"
         }  # 任务节点名与 LangGraph 节点名映射（确保一致性）
 
-    def get_next_pending_task(self, state: LCAIState) -> Optional[Task]:
+        # 可在执行节点内并行执行的任务类型（互不依赖、只追加各自结果的任务）
+        self.parallel_runners = {
+            "form_build": self.run_form_build
+        }
+        # 未声明依赖时，各任务类型默认依赖的前置任务类型
+        self.default_dependencies = {
+            "app_name_extract": None,
+            "app_create": "app_name_extract",
+            "form_build": "app_create"
+        }
+
+    def resolve_dependencies(self, state: LCAIState) -> None:
+        """
+        补全任务依赖：规划结果未声明depends_on时，按任务类型推断
+        app_create依赖最近的app_name_extract，form_build依赖最近的app_create，其余任务依赖上一个任务
+        """
+        last_task_of_type: Dict[str, int] = {}
+        previous_task_id = None
+        for task in sorted(state.execution_plan, key=lambda t: t.task_id):
+            if not task.depends_on:
+                if task.node_name in self.default_dependencies:
+                    dependency_type = self.default_dependencies[task.node_name]
+                    dependency = last_task_of_type.get(dependency_type) if dependency_type else None
+                else:
+                    dependency = previous_task_id
+                if dependency is not None:
+                    task.depends_on = [dependency]
+            last_task_of_type[task.node_name] = task.task_id
+            previous_task_id = task.task_id
+
+    def get_ready_tasks(self, state: LCAIState) -> List[Task]:
         """
-        获取任务队列中第一个待执行的任务（pending 状态）
+        获取所有就绪任务（pending 状态且依赖全部成功），按 task_id 升序
+        依赖失败的任务直接标记为失败
         """
         if not state.execution_plan:
             logger.warning(f"会话{state.session_id}：任务队列为空")
-            return None
+            return []
 
-        # 按 task_id 升序排序，获取第一个 pending 任务
-        sorted_tasks = sorted(state.execution_plan, key=lambda t: t.task_id)
-        next_task = next((t for t in sorted_tasks if t.status == "pending"), None)
-        return next_task
+        status_map = {t.task_id: t.status for t in state.execution_plan}
+        ready_tasks = []
+        for task in sorted(state.execution_plan, key=lambda t: t.task_id):
+            if task.status != "pending":
+                continue
+            dependency_status = [status_map.get(task_id, "success") for task_id in task.depends_on]
+            if any(status in ["failed", "need_human"] for status in dependency_status):
+                self.update_task_status(state, task.task_id, "failed", {"error": "依赖任务执行失败"})
+                # 失败需要向后传递，重新计算后续任务
+                status_map[task.task_id] = "failed"
+            elif all(status == "success" for status in dependency_status):
+                ready_tasks.append(task)
+        return ready_tasks
 
     def get_target_node(self, task: Task) -> str:
         """
@@ -41,6 +84,62 @@ class ExecutorAgent:
             logger.error(f"未知任务节点名：{task.node_name}，无法匹配 LangGraph 节点")
         return target_node
 
+    async def run_form_build(self, state: LCAIState, task: Task) -> Dict[str, Any]:
+        """并行执行单个表单搭建任务（使用以该任务为当前任务的状态副本，视图各自复制，避免并行任务互相写入）"""
+        task_state = state.model_copy(update={"current_task_id": task.task_id, "executing_plan": True,
+                                              "views": dict(state.views)})
+        model_info = await form_build_agent.build_form(state=task_state, form_name="", form_prompt="")
+        return {
+            "model_id": model_info["model_id"],
+            "form_name": model_info["form_name"],
+            "views": model_info["views"],
+            "message": f"表单创建成功:[{model_info['form_name']}]",
+            "msg": f"表单【{model_info['form_name']}({model_info['model_id']})】创建成功！"
+        }
+
+    async def execute_parallel(self, state: LCAIState, tasks: List[Task]) -> Dict[str, Any]:
+        """
+        并发执行一批就绪任务（并发数受EXECUTOR_MAX_PARALLEL限制），并将各任务结果合并到状态
+        :return: 合并后的状态更新
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.EXECUTOR_MAX_PARALLEL))
+
+        async def run(task: Task) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                self.update_task_status(state, task.task_id, "running")
+                try:
+                    result = await self.parallel_runners[task.node_name](state, task)
+                    self.update_task_status(state, task.task_id, "success",
+                                            {"model_id": result.get("model_id"), "form_name": result.get("form_name")})
+                    return result
+                except Exception as e:
+                    logger.error(f"会话{state.session_id}：任务{task.task_id}执行失败：{str(e)}")
+                    self.update_task_status(state, task.task_id, "failed", {"error": str(e)})
+                    return None
+
+        results = await asyncio.gather(*(run(task) for task in tasks))
+
+        # 按 task_id 顺序合并结果，后完成的表单作为当前表单
+        views = dict(state.views)
+        messages = []
+        msgs = []
+        updates: Dict[str, Any] = {}
+        for task, result in zip(tasks, results):
+            if result is None:
+                messages.append(AIMessage(content=f"任务{task.task_id}（{task.description}）执行失败"))
+                continue
+            views.update(result["views"])
+            messages.append(SystemMessage(content=result["message"]))
+            msgs.append(result["msg"])
+            updates["model_id"] = result["model_id"]
+            updates["form_name"] = result["form_name"]
+        updates["views"] = views
+        updates["msg"] = "\n".join(msgs)
+        if "model_id" in updates:
+            updates["website"] = get_app_run_url(state.meta.origin, state.meta.cur_workspaceId, state.app_id)
+        updates["messages"] = messages
+        return updates
+
     def update_task_status(self, state: LCAIState, task_id: int, status: str,
                            output: Optional[Dict[str, Any]] = None) -> None:
         """
@@ -55,6 +154,19 @@ class ExecutorAgent:
         else:
             logger.warning(f"会话{state.session_id}：未找到任务ID {task_id}，无法更新状态")
 
+    def snapshot_tasks(self, state: LCAIState) -> Dict[int, tuple]:
+        """
+        记录各任务当前的状态、结果及依赖（任务在执行过程中被原地更新）
+        """
+        return {t.task_id: (t.status, t.task_output, list(t.depends_on)) for t in state.execution_plan}
+
+    def changed_tasks(self, state: LCAIState, snapshot: Dict[int, tuple]) -> List[Task]:
+        """
+        对比快照，返回状态、结果或依赖发生变化的任务（由execution_plan的reducer按task_id合并）
+        """
+        return [t for t in state.execution_plan
+                if snapshot.get(t.task_id) != (t.status, t.task_output, list(t.depends_on))]
+
     def is_all_tasks_completed(self, state: LCAIState) -> bool:
         """
         判断任务队列是否全部执行完成（无 pending/running 任务）
@@ -67,13 +179,15 @@ class ExecutorAgent:
         """
         判断上一项任务是否成功：
         """
-        node_name = state.execution_plan[int(state.current_task_id) - 1].node_name
+        task = state.execution_plan[int(state.current_task_id) - 1]
+        node_name = task.node_name
         if node_name == "app_name_extract":
             return state.app_name != ""
         elif node_name == "app_create":
             return state.app_id != ""
         elif node_name == "form_build":
-            return state.model_id != ""
+            # 以本任务的执行结果为准（state.model_id可能是之前任务创建的表单）
+            return bool((task.task_output or {}).get("model_id"))
         else:
             return True
 
@@ -82,7 +196,20 @@ class ExecutorAgent:
         准备下一步流程：获取下一个任务，返回跳转节点信息
         """
         try:
-            # 1. 判断是否所有任务已完成
+            # 1. 更新上一项任务状态（仅处理仍在执行中的任务，校验失败则标记失败）
+            if state.current_task_id != "" and state.current_task_id != None:
+                current_task = next((t for t in state.execution_plan if t.task_id == state.current_task_id), None)
+                if current_task and current_task.status == "running":
+                    if self.validate_task(state):
+                        self.update_task_status(state, state.current_task_id, "success", current_task.task_output)
+                    else:
+                        self.update_task_status(state, state.current_task_id, "failed", {"error": "任务执行结果校验失败"})
+
+            # 2. 获取就绪任务（依赖全部成功；依赖失败的任务同时标记为失败）
+            self.resolve_dependencies(state)
+            ready_tasks = self.get_ready_tasks(state)
+
+            # 3. 判断是否所有任务已完成
             if self.is_all_tasks_completed(state):
                 completed_count = len([t for t in state.execution_plan if t.status == "success"])
                 total_count = len(state.execution_plan)
@@ -93,30 +220,41 @@ class ExecutorAgent:
                     "finished": True,
                     "planner_feedback": feedback,
                     "next_node": END,  # 所有任务完成，跳转至结束
-                    "messages": add_messages(state.messages, [SystemMessage(content=feedback)])
+                    "messages": [SystemMessage(content=feedback)]
                 }
-            # 2. 更新上一项任务状态
-            if state.current_task_id != "" and state.current_task_id != None:
-                task_success = self.validate_task(state)
-                if task_success:
-                    self.update_task_status(state, state.current_task_id, "success")
-
-            # 2. 获取下一个待执行任务
-            next_task = self.get_next_pending_task(state)
-            if not next_task:
+            if not ready_tasks:
                 feedback = "任务队列无待执行任务，流程结束"
                 return {
                     "executing_plan": True,
                     "finished": True,
                     "planner_feedback": feedback,
                     "next_node": END,
-                    "messages": add_messages(state.messages, [SystemMessage(content=feedback)])
+                    "messages": [SystemMessage(content=feedback)]
+                }
+
+            # 4. 多个可并行的就绪任务：在执行节点内并发执行，完成后回到 executor 继续调度
+            if len(ready_tasks) > 1 and all(t.node_name in self.parallel_runners for t in ready_tasks):
+                task_ids = "、".join(str(t.task_id) for t in ready_tasks)
+                logger.info(f"会话{state.session_id}：并行执行任务{task_ids}")
+                updates = await self.execute_parallel(state, ready_tasks)
+                success_count = len([t for t in ready_tasks if t.status == "success"])
+                feedback = f"并行执行任务{task_ids}完成，成功{success_count}/{len(ready_tasks)}个"
+                logger.info(f"会话{state.session_id}：{feedback}")
+                messages = updates.pop("messages") + [SystemMessage(content=feedback)]
+                return {
+                    "executing_plan": True,
+                    "current_task_id": None,
+                    "planner_feedback": feedback,
+                    "next_node": "executor_agent",
+                    "messages": messages,
+                    "state_updates": updates
                 }
 
-            # 3. 更新当前任务为 running 状态
+            # 5. 更新当前任务为 running 状态（单个任务跳转至对应功能节点执行）
+            next_task = ready_tasks[0]
             self.update_task_status(state, next_task.task_id, "running")
 
-            # 4. 获取要跳转的 LangGraph 节点
+            # 6. 获取要跳转的 LangGraph 节点
             target_node = self.get_target_node(next_task)
             if not target_node:
                 feedback = f"任务{next_task.task_id}（{next_task.node_name}）无法匹配功能节点，执行失败"
@@ -126,10 +264,10 @@ class ExecutorAgent:
                     "current_task_id": next_task.task_id,
                     "planner_feedback": feedback,
                     "next_node": "executor_agent",  # 跳转回 executor，处理下一个任务
-                    "messages": add_messages(state.messages, [AIMessage(content=feedback)])
+                    "messages": [AIMessage(content=feedback)]
                 }
 
-            # 5. 返回跳转信息
+            # 7. 返回跳转信息
             feedback = f"即将执行任务{next_task.task_id}/{len(state.execution_plan)}：{next_task.description}，跳转至「{target_node}」节点"
             logger.info(f"会话{state.session_id}：{feedback}")
             return {
@@ -138,7 +276,7 @@ class ExecutorAgent:
                 "current_task_node": target_node,
                 "planner_feedback": feedback,
                 "next_node": target_node,  # 告诉 LangGraph 下一步跳转的节点
-                "messages": add_messages(state.messages, [SystemMessage(content=feedback)])
+                "messages": [SystemMessage(content=feedback)]
             }
         except Exception as e:
             error_msg = f"Executor 准备下一步流程失败：{str(e)}"
@@ -148,7 +286,7 @@ class ExecutorAgent:
                 "finished": True,
                 "planner_feedback": error_msg,
                 "next_node": END,
-                "messages": add_messages(state.messages, [AIMessage(content=error_msg)])
+                "messages": [AIMessage(content=error_msg)]
             }
 
 
@@ -37,10 +37,12 @@ class FormBuildAgent:
     model_json = {}
 
     @classmethod
-    async def build_form(cls, state: LCAIState, form_name: str, form_prompt: str) -> Dict[str, Any]:
+    async def build_form(cls, state: LCAIState, form_name: str, form_prompt: str,
+                         field_requirements: str = "") -> Dict[str, Any]:
         """
         生成表单
         :param user_input: 用户表单需求
+        :param field_requirements: 已知的字段要求（非空时不再单独提取）
         :return: 表单信息
         """
         # 0.入参初始化
@@ -56,7 +58,9 @@ class FormBuildAgent:
                 form_prompt = state.user_input
 
         # 1.提取表单搭建需求中的字段要求：
-        if not state.executing_plan:
+        if field_requirements:
+            logger.info(f"字段要求：{field_requirements[:50]}...")
+        elif not state.executing_plan:
             extract_fr_prompt = cls.FORM_FIELD_REQUIREMENT_PROMPT_TEMPLATE.format(user_input=form_prompt)
             logger.info(f"表单搭建智能体处理[表单字段要求提取]请求：{form_prompt[:50]}...")
             try:
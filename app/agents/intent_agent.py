@@ -1,5 +1,6 @@
 from typing import Literal
 from app.services.ds_platform import ds_client
+from app.services.intent_classifier import intent_classifier, match_rules
 from app.config.settings import settings
 from app.utils.logger import logger
 from app.utils.exceptions import IntentRecognitionError
@@ -29,8 +30,14 @@ class IntentAgent:
         """
         prompt = cls.INTENT_PROMPT_TEMPLATE.format(user_input=user_input)
 
-        # 强制通过规划智能体
-        if "两个" in user_input or "然后" in user_input or ("先" in user_input and "后" in user_input):
+        # 本地快速判定：置信度达到阈值时不再调用LLM（关键词规则命中时置信度低于阈值，仍由LLM判定）
+        # 未启用本地判定时沿用关键词规则，强制通过规划智能体
+        if settings.INTENT_LOCAL_ENABLED:
+            intent, confidence = intent_classifier.predict(user_input)
+            if confidence >= settings.INTENT_LOCAL_THRESHOLD:
+                logger.info(f"本地意图识别结果：{intent}，置信度：{confidence:.2f}，用户输入：{user_input}")
+                return intent
+        elif match_rules(user_input):
             return "complex"
         try:
             response = await ds_client.call_llm(
@@ -38,12 +45,13 @@ class IntentAgent:
                 chatId=chatId,
                 prompt=prompt,
                 stream=False,
-                temperature=0.0  # 意图识别用极低温度保证准确性
+                temperature=0.0,  # 意图识别用极低温度保证准确性
+                hedge=True  # 短小幂等调用，慢请求时发起对冲
             )
 
             intent = response["content"].strip().lower()
             logger.info(f"意图识别结果：{intent}，用户输入：{user_input}")
-
+            await intent_classifier.record(user_input, intent)
 
             return intent
         except Exception as e:
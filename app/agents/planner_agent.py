@@ -33,6 +33,7 @@ class PlannerAgent:
             3. 注意事项：
                 - 子任务必须按「先创建应用，后创建表单」的顺序排列
                 - 每个任务的status初始化为pending，task_id从1开始递增
+                - 每个任务的depends_on填写其直接依赖的task_id列表；多个表单之间互不依赖，均只依赖app_create任务
                 - 任务描述要清晰，包含具体的应用/表单名称及核心要求
 
             输出格式必须符合以下结构（严格遵循Pydantic List[Task]规范）：
@@ -69,6 +70,7 @@ class PlannerAgent:
                     node_name="app_create",
                     description="创建名为「会议预定」的应用",
                     status="pending",
+                    depends_on=[1],
                     # output=None
                 ),
                 Task(
@@ -76,6 +78,7 @@ class PlannerAgent:
                     node_name="form_build",
                     description="创建「会议室信息」表单，包含会议室名称、楼层、房间号、最大容纳人数字段",
                     status="pending",
+                    depends_on=[2],
                     # output=None
                 ),
                 Task(
@@ -83,6 +86,7 @@ class PlannerAgent:
                     node_name="form_build",
                     description="创建「会议室预订信息」表单，包含预订时间段字段",
                     status="pending",
+                    depends_on=[2],
                     # output=None
                 )
             ]
@@ -0,0 +1,79 @@
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.config.settings import settings
+from app.models.state import RequestUnderstanding
+from app.services.ds_platform import ds_client
+from app.utils.exceptions import IntentRecognitionError
+from app.utils.logger import logger
+
+# 应用名称及关键词中去掉的泛化词
+_GENERIC_WORDS = ("应用", "系统", "平台", "工具", "流程", "相关")
+
+
+class UnderstandAgent:
+    """需求理解智能体：一次调用同时完成意图识别、应用名提取、模板检索关键词提取及表单字段提示提取"""
+
+    def __init__(self):
+        self.parser = PydanticOutputParser(pydantic_object=RequestUnderstanding)
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", """
+            你是低代码平台的需求理解助手，需要一次性分析用户输入，返回以下信息：
+            1. intent_type（意图类型，仅取以下之一）：
+                - complex：用户需求较复杂，可拆分为多个子任务，如用户指定要创建多个应用、多个表单的情形，必然属于此类
+                - qa：低代码平台使用帮助、问答类需求
+                - app_build：搭建/修改低代码应用相关需求
+                - form_modify：修改表单
+                - human_confirm：人工确认节点，只有明确说明要人工确认才返回这个！
+                - unknown：无法识别的意图
+            2. app_name（应用名称）：描述应用功能或用途的核心短语，忽略“应用”“系统”“平台”等泛化词，不含特殊字符；
+               intent_type为app_build或complex时不得为空，未明确提及时根据上下文推断（如“事务管理”“信息登记”）
+            3. keywords（应用模板检索关键词）：以2字核心词为主，聚焦服务对象、业务动作或场景主体，
+               如“我想做一个库存管理系统”→["库存", "管理系统"]，“搭建报销申请相关应用”→["报销"]；非搭建类需求返回空列表
+            4. forms（表单提示）：用户提到的每个表单的form_name及field_requirements（字段中文名逗号分隔，没有则为空字符串）；
+               未提到表单时返回空列表
+
+            输出格式必须符合以下结构：
+            {format_instructions}
+            """),
+            ("user", "用户输入：{user_input}")
+        ]).partial(format_instructions=self.parser.get_format_instructions())
+
+    @staticmethod
+    def _clean(understanding: RequestUnderstanding) -> RequestUnderstanding:
+        """去掉泛化词、空关键词"""
+        app_name = understanding.app_name.strip()
+        for word in _GENERIC_WORDS:
+            app_name = app_name.replace(word, "") or app_name
+        understanding.app_name = app_name
+        understanding.keywords = [key.strip() for key in understanding.keywords if key.strip()]
+        return understanding
+
+    async def understand(self, chatId: str, user_input: str) -> RequestUnderstanding:
+        """
+        理解用户需求
+        :param user_input: 用户输入
+        :return: 需求理解结果
+        """
+        prompt = self.prompt.format(user_input=user_input)
+        try:
+            response = await ds_client.call_llm(
+                api_key=settings.DS_API_KEY_INTENT,
+                chatId=chatId,
+                prompt=prompt,
+                stream=False,
+                temperature=0.0  # 意图识别用极低温度保证准确性（提示词与输出较长，不做对冲）
+            )
+            understanding = self._clean(self.parser.parse(response["content"]))
+        except Exception as e:
+            logger.error(f"需求理解失败：{str(e)}", exc_info=True)
+            raise IntentRecognitionError(f"需求理解失败：{str(e)}")
+
+        if understanding.intent_type in ("app_build", "complex") and not understanding.app_name:
+            raise IntentRecognitionError(f"无效的应用名称识别结果：{understanding.app_name}")
+        logger.info(f"需求理解结果：{understanding.model_dump()}，用户输入：{user_input}")
+        return understanding
+
+
+# 全局实例
+understand_agent = UnderstandAgent()
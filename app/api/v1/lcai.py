@@ -1,9 +1,8 @@
 import time
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Body
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Body, Request, Response
 from fastapi.responses import StreamingResponse
-from typing import Generator, Dict, Any, AsyncGenerator
-import json
+from typing import Generator, Dict, Any, AsyncGenerator, Optional
 from langchain_core.messages import HumanMessage, BaseMessage
 from langgraph.types import Command
 
@@ -13,19 +12,98 @@ from app.models.state import LCAIState
 from app.graph.lcai_graph import lcai_graph
 from app.utils.logger import logger
 from app.utils.exceptions import DSPlatformError, FormStorageError
-from app.utils.state_persistence import load_paused_state, delete_paused_state, save_paused_state
+from app.utils.timing import StageTimer, use_timer
+from app.utils.trace import trace_exporter
+from app.utils.disconnect import cancel_on_disconnect
+from app.utils.sse import sse_encoder
 
 router = APIRouter(prefix="/lcai", tags=["LCAI核心接口"])
 
 
+def _new_timer(debug_timing: bool, traced: bool) -> Optional[StageTimer]:
+    """按需创建请求级阶段耗时记录：返回阶段耗时或抽中记录执行轨迹时创建"""
+    if traced:
+        return trace_exporter.new_timer()
+    return StageTimer() if debug_timing else None
+
+
+def _timing_headers(timer: Optional[StageTimer], debug_timing: bool = True) -> Optional[Dict[str, str]]:
+    """同步调用的Server-Timing响应头（未开启阶段耗时时为None）"""
+    return {"Server-Timing": timer.server_timing()} if timer is not None and debug_timing else None
+
+
+def _start_stream_timer(timer: Optional[StageTimer]) -> None:
+    """流式响应开始时绑定阶段耗时记录，并记录从收到请求到开始执行的等待时间"""
+    use_timer(timer)
+    if timer is not None:
+        timer.add("queue:stream", time.perf_counter() - timer.start, timer.start)
+
+
+async def _graph_frames(graph_input: Any, config: Dict[str, Any], session_id: str, timer: Optional[StageTimer],
+                        debug_timing: bool) -> AsyncGenerator[bytes, None]:
+    """
+    执行流程并逐帧输出SSE消息（/stream与/confirm共用）
+    :param graph_input: 流程输入（初始状态，或恢复中断的Command）
+    :param config: 会话配置
+    :param session_id: 会话ID
+    :param timer: 请求级阶段耗时记录
+    :param debug_timing: 是否在end帧返回各阶段耗时
+    """
+    _start_stream_timer(timer)
+    # 运行图形直到结束或遇到中断
+    async for mode, chunk in lcai_graph.astream(graph_input, config=config, stream_mode=["updates", "custom"]):
+        if mode == "custom":
+            # 节点推送的增量片段（如问答回答的delta），原样转发
+            yield sse_encoder.encode(chunk)
+            continue
+        for node_name, node_data in chunk.items():
+            if node_name == "__interrupt__":
+                # 中断节点的node_data是tuple，需要特殊处理
+                for interrupt in node_data:
+                    logger.info(f"会话{session_id}：遇到中断节点【{interrupt.value.get('pause_at')}】，等待用户响应")
+                    yield sse_encoder.interrupt_frame(session_id, interrupt.value)
+            else:
+                # 流式返回节点输出（增量内容）
+                frame = sse_encoder.node_frame(node_name, node_data)
+                sse_encoder.log_frame(session_id, node_name, frame)
+                yield frame
+    # 发送结束标识
+    yield sse_encoder.end_frame(timer.summary() if timer is not None and debug_timing else None)
+
+
+def _stream_response(raw_request: Request, graph_input: Any, session_id: str, endpoint: str, debug_timing: bool,
+                     headers: Dict[str, str]) -> StreamingResponse:
+    """
+    构建流式响应：客户端断开时取消流程执行，抽中的会话记录执行轨迹
+    :param raw_request: 原始请求（用于检测客户端断开）
+    :param graph_input: 流程输入
+    :param session_id: 会话ID
+    :param endpoint: 接口名（指标标签、轨迹文件名）
+    :param debug_timing: 是否在end帧返回各阶段耗时
+    :param headers: 响应头
+    """
+    traced = trace_exporter.sampled(session_id)
+    timer = _new_timer(debug_timing, traced)
+    config = {"configurable": {"thread_id": session_id}}
+    stream = cancel_on_disconnect(raw_request, _graph_frames(graph_input, config, session_id, timer, debug_timing),
+                                  session_id, endpoint)
+    if traced:
+        stream = trace_exporter.wrap_stream(stream, timer, session_id, endpoint)
+    return StreamingResponse(stream, media_type="text/event-stream", headers=headers)
+
+
 # 同步调用接口
 @router.post("/invoke", response_model=LCAIResponse)
-async def invoke_lcai(request: LCAIRequest):
+async def invoke_lcai(request: LCAIRequest, response: Response):
     """
     同步调用LCAI智能体
     :param request: LCAI请求参数
+    :param response: 响应（开启debug_timing时写入Server-Timing响应头）
     :return: 同步响应结果
     """
+    traced = trace_exporter.sampled(request.meta.chatId)
+    timer = _new_timer(bool(request.debug_timing), traced)
+    use_timer(timer)
     try:
         logger.info(f"同步调用LCAI: 用户：{request.meta.userId}-{request.meta.lcUserName} | 环境：{request.meta.origin} "
                     f"| 场景信息：workspace={request.meta.cur_workspaceId}, app={request.meta.cur_appId}, form={request.meta.cur_modelId} | user_input={request.user_input[:50]}...")
@@ -34,14 +112,19 @@ async def invoke_lcai(request: LCAIRequest):
         initial_state = LCAIState(
             session_id=request.meta.chatId,
             user_input=request.user_input,
+            meta=request.meta,  # 供智能体流程使用（如根据origin选择低代码平台环境）
             messages=[HumanMessage(content=request.user_input)]
-            # 可选：将meta存入状态，供智能体流程使用（比如根据origin选择不同DS平台环境）
-            # meta=LCAIMeta.model_dump()
         )
         logger.info(f"初始状态类型：{type(initial_state)}")  # 必须输出 <class 'app.models.state.LCAIState'>
 
-        # 执行LangGraph流程
-        result = await lcai_graph.ainvoke(initial_state)  # 注意返回时为 dict类型
+        # 执行LangGraph流程（检查点按会话保存，需指定thread_id）
+        thread = {"configurable": {"thread_id": request.meta.chatId}}
+        monitor = trace_exporter.start(timer) if traced else None
+        try:
+            result = await lcai_graph.ainvoke(initial_state, config=thread)  # 注意返回时为 dict类型
+        finally:
+            if monitor is not None:
+                await trace_exporter.finish(timer, monitor, request.meta.chatId, "invoke")
 
         # 简化对话内容
         conversation = []
@@ -65,6 +148,8 @@ async def invoke_lcai(request: LCAIRequest):
             "meta": request.meta.model_dump()
         }
 
+        if request.debug_timing:
+            response.headers.update(_timing_headers(timer))
         return LCAIResponse(
             code=200,
             msg="success",
@@ -73,21 +158,23 @@ async def invoke_lcai(request: LCAIRequest):
         )
     except DSPlatformError as e:
         logger.error(f"DS平台调用失败：{str(e)}")
-        raise HTTPException(status_code=e.code, detail=e.message)
+        raise HTTPException(status_code=e.code, detail=e.message, headers=_timing_headers(timer, request.debug_timing))
     except FormStorageError as e:
         logger.error(f"表单保存失败：{str(e)}")
-        raise HTTPException(status_code=e.code, detail=e.message)
+        raise HTTPException(status_code=e.code, detail=e.message, headers=_timing_headers(timer, request.debug_timing))
     except Exception as e:
         logger.error(f"LCAI同步调用失败：{str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"服务异常：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"服务异常：{str(e)}",
+                            headers=_timing_headers(timer, request.debug_timing))
 
 
 # 流式调用接口
 @router.post("/stream")
-async def stream_lcai(request: LCAIRequest):
+async def stream_lcai(request: LCAIRequest, raw_request: Request):
     """
     流式调用LCAI智能体
     :param request: LCAI请求参数
+    :param raw_request: 原始请求（用于检测客户端断开）
     :return: 流式响应结果
     """
     try:
@@ -99,61 +186,12 @@ async def stream_lcai(request: LCAIRequest):
             session_id=request.meta.chatId,
             user_input=request.user_input,
             meta=request.meta,
+            delta_stream=bool(request.delta_stream),
             messages=[HumanMessage(content=request.user_input)]
         )
 
-        # 设置会话
-        thread = {"configurable": {"thread_id": request.meta.chatId}}
-
-        # 生成流式响应
-        async def stream_generator() -> AsyncGenerator[str, None]:
-            # 运行图形直到遇到中断
-            async for chunk in lcai_graph.astream(initial_state, config=thread, stream_mode="updates"):
-                for node_name, node_data in chunk.items():
-                    if node_name == "__interrupt__":
-                        # 中断节点的node_data是tuple，需要特殊处理
-                        for interrupt in node_data:
-                            data = interrupt.value
-                            interrupt_info = {
-                                "type": "interrupt",
-                                "node": "__interrupt__",
-                                "time": time.strftime('%Y-%m-%d %H:%M:%S'),
-                                "pause_info": {
-                                    **data,
-                                    "session_id": request.meta.chatId,
-                                    "sysMsg":"流程已暂停，请通过 /lcai/confirm 接口继续"
-                                },
-                                "finished": False
-                            }
-                            print(f'会话{initial_state.session_id}|| 遇到中断节点【{data["pause_at"]},等待用户响应中...\n信息：{data}】')
-                            yield f"data: {json.dumps(interrupt_info, ensure_ascii=False)}\n\n"
-                    else:
-                        if "messages" in node_data:
-                            del node_data["messages"]
-                        if "execution_plan" in node_data:
-                            del node_data["execution_plan"]
-                        if "node" not in node_data:
-                            node_data["node"] = node_name
-                        node_data["time"] = time.strftime('%Y-%m-%d %H:%M:%S')
-                        print(f'会话{initial_state.session_id}|| 节点【{node_name}】输出:{node_data}')
-                        # 流式返回消息内容（增量内容）
-                        yield f"data: {json.dumps(node_data,ensure_ascii=False)}\n\n"
-
-            # async for chunk in lcai_graph.astream(initial_state, config=thread, stream_mode="values"):
-            #     print(chunk)
-            # 发送结束标识
-            end_chunk = {
-                "type": "end",
-                "msg": "",
-                "finished": True
-            }
-            yield f"data: {json.dumps(end_chunk,ensure_ascii=False)}\n\n"
-
-        return StreamingResponse(
-            stream_generator(),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no","Connection": "keep-alive"}
-        )
+        return _stream_response(raw_request, initial_state, request.meta.chatId, "stream", bool(request.debug_timing),
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Connection": "keep-alive"})
     except Exception as e:
         logger.error(f"LCAI流式调用失败：{str(e)}", exc_info=True)
         # 发送错误流
@@ -171,76 +209,25 @@ async def stream_lcai(request: LCAIRequest):
 # 二次调用接口：用户确认/继续
 @router.post("/confirm")
 async def confirm_lcai(
+        raw_request: Request,
         session_id: str = Body(..., embed=True),  # 会话ID（和首次请求一致）
-        user_input: str = Body(..., embed=True)  # 用户输入："是"表示继续
+        user_input: str = Body(..., embed=True),  # 用户输入："是"表示继续
+        debug_timing: bool = Body(False, embed=True)  # 是否在end帧返回各阶段耗时
 ):
     """
     二次调用LCAI智能体 - 处理用户确认
     :param session_id: 会话ID
     :param user_input: 用户输入（"是"表示继续执行）
+    :param debug_timing: 是否在end帧返回各阶段耗时
+    :param raw_request: 原始请求（用于检测客户端断开）
     :return: 流式响应结果
     """
     try:
         logger.info(f"二次调用LCAI: session_id={session_id}, user_input={user_input}")
 
-        # 构建继续执行的配置
-        config = {
-            "configurable": {"thread_id": session_id},
-        }
-
-        # 构建新的状态（包含用户的确认输入）
-        new_state = {
-            "user_input": user_input,
-            "paused": False
-        }
-
-        # 生成流式响应
-        async def stream_generator() -> AsyncGenerator[str, None]:
-            # 从检查点恢复执行
-            async for chunk in lcai_graph.astream(Command(resume=user_input), config=config, stream_mode="updates"):
-                for node_name, node_data in chunk.items():
-                    if node_name == "__interrupt__":
-                        # 中断节点的node_data是tuple，需要特殊处理
-                        for interrupt in node_data:
-                            data = interrupt.value
-                            interrupt_info = {
-                                "type": "interrupt",
-                                "node": "__interrupt__",
-                                "time": time.strftime('%Y-%m-%d %H:%M:%S'),
-                                "pause_info": {
-                                    **data,
-                                    "session_id": session_id,
-                                    "sysMsg": "流程已暂停，请通过 /lcai/confirm 接口继续"
-                                },
-                                "finished": False
-                            }
-                            print(
-                                f'会话{session_id}|| 遇到中断节点【{data["pause_at"]},等待用户响应中...\n信息：{data}】')
-                            yield f"data: {json.dumps(interrupt_info, ensure_ascii=False)}\n\n"
-                    else:
-                        if "messages" in node_data:
-                            del node_data["messages"]
-                        if "execution_plan" in node_data:
-                            del node_data["execution_plan"]
-                        if "node" not in node_data:
-                            node_data["node"] = node_name
-                        node_data["time"] = time.strftime('%Y-%m-%d %H:%M:%S')
-                        print(f'会话{session_id}|| 节点【{node_name}】输出:{node_data}')
-                        # 流式返回消息内容（增量内容）
-                        yield f"data: {json.dumps(node_data, ensure_ascii=False)}\n\n"
-            # 发送结束标识
-            end_chunk = {
-                "type": "end",
-                "msg": "",
-                "finished": True
-            }
-            yield f"data: {json.dumps(end_chunk, ensure_ascii=False)}\n\n"
-
-        return StreamingResponse(
-            stream_generator(),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
-        )
+        # 从检查点恢复执行
+        return _stream_response(raw_request, Command(resume=user_input), session_id, "confirm", debug_timing,
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     except Exception as e:
         logger.error(f"LCAI流式调用失败：{str(e)}", exc_info=True)
         # 发送错误流
@@ -19,6 +19,56 @@ class Settings(BaseConfig):
     DS_API_KEY_GENERAL_USE: str = os.getenv("API_KEY_GENERAL_USE")
     DS_MODEL_NAME: str = os.getenv("DS_MODEL_NAME", "qwen-plus")
 
+    # LLM响应缓存（仅缓存低温度的非流式调用）
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_TEMPERATURE: float = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.0))
+    LLM_CACHE_MAX_SIZE: int = int(os.getenv("LLM_CACHE_MAX_SIZE", 2048))
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", 3600))
+    LLM_CACHE_DISK_PATH: str = os.getenv("LLM_CACHE_DISK_PATH", "")  # 为空则不启用磁盘缓存
+    LLM_CACHE_PURGE_INTERVAL: float = float(os.getenv("LLM_CACHE_PURGE_INTERVAL", 300))  # 磁盘缓存过期数据清理间隔（秒）
+    # 相同请求并发合并（LLM非流式调用及S_BE只读查询）
+    LLM_COALESCE_ENABLED: bool = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+    S_BE_COALESCE_ENABLED: bool = os.getenv("S_BE_COALESCE_ENABLED", "true").lower() == "true"
+    # DS平台按API Key限流（0为不限）
+    DS_KEY_MAX_CONCURRENCY: int = int(os.getenv("DS_KEY_MAX_CONCURRENCY", 8))
+    DS_KEY_RPM: int = int(os.getenv("DS_KEY_RPM", 0))
+    DS_KEY_TPM: int = int(os.getenv("DS_KEY_TPM", 0))
+    DS_KEY_QUEUE_TIMEOUT: float = float(os.getenv("DS_KEY_QUEUE_TIMEOUT", 60))
+    # 单个Key的覆盖配置（JSON），key为DS_API_KEY_后缀，如：{"QA": {"concurrency": 4, "rpm": 60, "tpm": 100000}}
+    DS_KEY_LIMITS: str = os.getenv("DS_KEY_LIMITS", "")
+    # DS平台重试（仅针对5xx及连接类错误，受重试预算约束）
+    DS_RETRY_MAX: int = int(os.getenv("DS_RETRY_MAX", 2))
+    DS_RETRY_BASE_DELAY: float = float(os.getenv("DS_RETRY_BASE_DELAY", 0.5))
+    DS_RETRY_MAX_DELAY: float = float(os.getenv("DS_RETRY_MAX_DELAY", 5))
+    DS_RETRY_BUDGET_RATIO: float = float(os.getenv("DS_RETRY_BUDGET_RATIO", 0.1))
+    DS_RETRY_BUDGET_RESERVE: float = float(os.getenv("DS_RETRY_BUDGET_RESERVE", 10))
+    # DS平台对冲请求（仅对调用方显式开启hedge的非流式调用生效）
+    DS_HEDGE_ENABLED: bool = os.getenv("DS_HEDGE_ENABLED", "true").lower() == "true"
+    DS_HEDGE_PERCENTILE: float = float(os.getenv("DS_HEDGE_PERCENTILE", 95))
+    DS_HEDGE_MIN_SAMPLES: int = int(os.getenv("DS_HEDGE_MIN_SAMPLES", 20))
+    DS_HEDGE_DEFAULT_DELAY: float = float(os.getenv("DS_HEDGE_DEFAULT_DELAY", 2.0))
+
+    # 低代码平台S_BE服务连接池（按origin独立）
+    S_BE_MAX_CONNECTIONS: int = int(os.getenv("S_BE_MAX_CONNECTIONS", 50))
+    S_BE_MAX_KEEPALIVE: int = int(os.getenv("S_BE_MAX_KEEPALIVE", 20))
+    S_BE_KEEPALIVE_EXPIRY: float = float(os.getenv("S_BE_KEEPALIVE_EXPIRY", 30))
+    S_BE_DEFAULT_TIMEOUT: float = float(os.getenv("S_BE_DEFAULT_TIMEOUT", 60))
+    # 各接口超时覆盖配置（JSON），如：{"S_BE_LA_18": 10}
+    S_BE_ENDPOINT_TIMEOUTS: str = os.getenv("S_BE_ENDPOINT_TIMEOUTS", "")
+
+    # 应用模板目录缓存（本地检索，过期后后台刷新）
+    APP_TEMPLATE_CATALOG_ENABLED: bool = os.getenv("APP_TEMPLATE_CATALOG_ENABLED", "true").lower() == "true"
+    APP_TEMPLATE_CATALOG_REFRESH: int = int(os.getenv("APP_TEMPLATE_CATALOG_REFRESH", 600))
+    APP_TEMPLATE_CATALOG_MAX_SIZE: int = int(os.getenv("APP_TEMPLATE_CATALOG_MAX_SIZE", 1024))  # 按用户保存的快照数上限
+    APP_TEMPLATE_CATALOG_MIN_SCORE: float = float(os.getenv("APP_TEMPLATE_CATALOG_MIN_SCORE", 0.5))
+    APP_TEMPLATE_CATALOG_LIMIT: int = int(os.getenv("APP_TEMPLATE_CATALOG_LIMIT", 10))
+
+    # 表单视图缓存（跨会话共享，表单创建/修改后失效）
+    FORM_VIEW_CACHE_SIZE: int = int(os.getenv("FORM_VIEW_CACHE_SIZE", 512))
+    FORM_VIEW_CACHE_TTL: int = int(os.getenv("FORM_VIEW_CACHE_TTL", 1800))
+    # 应用内表单列表（modelVersion来源）只短时缓存，及时感知设计器或其他worker的修改
+    FORM_MODEL_LIST_CACHE_TTL: int = int(os.getenv("FORM_MODEL_LIST_CACHE_TTL", 10))
+
     # 第三方表单保存API
     FORM_STORAGE_API_URL: str = os.getenv("FORM_STORAGE_API_URL")
     FORM_STORAGE_API_KEY: str = os.getenv("FORM_STORAGE_API_KEY")
@@ -27,14 +77,57 @@ class Settings(BaseConfig):
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", 8000))
     API_CORS_ORIGINS: list = os.getenv("API_CORS_ORIGINS", "*").split(",")
+    # worker进程数：大于1时检查点须使用sqlite存储（多进程共用同一数据库文件）；热重载仅单进程时生效
+    API_WORKERS: int = int(os.getenv("API_WORKERS", 1))
+    API_RELOAD: bool = os.getenv("API_RELOAD", "true").lower() == "true"
 
     # 低代码前端
     CODE_DISPLAY_ORIGIN: str = os.getenv("CODE_DISPLAY_ORIGIN", "http://localhost:8080")
     # 会话配置
     CONTEXT_EXPIRE_TIME: int = int(os.getenv("CONTEXT_EXPIRE_TIME", 3600))
+    # LangGraph检查点存储：sqlite（有界持久化）或 memory（进程内，仅调试用）；会话按CONTEXT_EXPIRE_TIME过期
+    CHECKPOINT_BACKEND: str = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+    CHECKPOINT_DB_PATH: str = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.db")
+    CHECKPOINT_MAX_HISTORY: int = int(os.getenv("CHECKPOINT_MAX_HISTORY", 20))
+    CHECKPOINT_HOT_CACHE_SIZE: int = int(os.getenv("CHECKPOINT_HOT_CACHE_SIZE", 256))
+    CHECKPOINT_COMPACT_INTERVAL: int = int(os.getenv("CHECKPOINT_COMPACT_INTERVAL", 300))
+    CHECKPOINT_BUSY_TIMEOUT: int = int(os.getenv("CHECKPOINT_BUSY_TIMEOUT", 5000))  # 毫秒，多worker并发写入时等待
+    # 检查点序列化：ormsgpack编码后超过阈值（字节）的数据用zstd压缩（以少量CPU换检查点体积，小数据不压缩）
+    CHECKPOINT_COMPRESS_THRESHOLD: int = int(os.getenv("CHECKPOINT_COMPRESS_THRESHOLD", 4096))
+    CHECKPOINT_COMPRESS_LEVEL: int = int(os.getenv("CHECKPOINT_COMPRESS_LEVEL", 3))
+    # 会话历史窗口：messages（按消息数）/tokens（按token数）/off，每轮入口移出更早的完整轮次
+    HISTORY_WINDOW_MODE: str = os.getenv("HISTORY_WINDOW_MODE", "messages")
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", 50))
+    HISTORY_MAX_TOKENS: int = int(os.getenv("HISTORY_MAX_TOKENS", 4000))
+    HISTORY_TOKEN_ENCODING: str = os.getenv("HISTORY_TOKEN_ENCODING", "cl100k_base")
+    HISTORY_MAX_VIEWS: int = int(os.getenv("HISTORY_MAX_VIEWS", 20))
+    # 执行轨迹导出：按会话抽样（0~1），每次请求写一个Chrome trace-event JSON文件，目录内最多保留TRACE_MAX_FILES个
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+    TRACE_DIR: str = os.getenv("TRACE_DIR", "data/traces")
+    TRACE_MAX_FILES: int = int(os.getenv("TRACE_MAX_FILES", 200))
+    TRACE_MAX_EVENTS: int = int(os.getenv("TRACE_MAX_EVENTS", 5000))
+    TRACE_LOOP_LAG_THRESHOLD: float = float(os.getenv("TRACE_LOOP_LAG_THRESHOLD", 0.02))  # 秒，事件循环阻塞超过该值时记入轨迹
+    # 流式响应帧日志：每隔SSE_LOG_SAMPLE_EVERY帧记录一帧（0不记录），单条最多SSE_LOG_MAX_CHARS字符
+    SSE_LOG_SAMPLE_EVERY: int = int(os.getenv("SSE_LOG_SAMPLE_EVERY", 50))
+    SSE_LOG_MAX_CHARS: int = int(os.getenv("SSE_LOG_MAX_CHARS", 300))
+    # 日志经队列由后台线程写出（不阻塞事件循环）
+    LOG_ENQUEUE: bool = os.getenv("LOG_ENQUEUE", "true").lower() == "true"
 
     # 逻辑配置
     HUMAN_CONFIRM_PLAN: bool = False
+    # 本地意图分类器（置信度达到阈值时不调用LLM）
+    INTENT_LOCAL_ENABLED: bool = os.getenv("INTENT_LOCAL_ENABLED", "true").lower() == "true"
+    INTENT_LOCAL_THRESHOLD: float = float(os.getenv("INTENT_LOCAL_THRESHOLD", 0.95))
+    INTENT_LOCAL_MIN_COVERAGE: float = float(os.getenv("INTENT_LOCAL_MIN_COVERAGE", 0.3))
+    # 关键词规则命中时的置信度（低于INTENT_LOCAL_THRESHOLD时仍由LLM判定）
+    INTENT_LOCAL_RULE_CONFIDENCE: float = float(os.getenv("INTENT_LOCAL_RULE_CONFIDENCE", 0.9))
+    INTENT_SAMPLE_LOG_PATH: str = os.getenv("INTENT_SAMPLE_LOG_PATH", "")  # LLM意图判定样本日志，为空则不记录
+    # 合并提取：一次LLM调用同时提取意图、应用名、检索关键词及表单提示，后续节点直接读取
+    FUSED_UNDERSTANDING_ENABLED: bool = os.getenv("FUSED_UNDERSTANDING_ENABLED", "false").lower() == "true"
+    # 意图识别同时预取应用名称及应用模板（意图为app_build时采用，否则取消）
+    SPECULATIVE_PREFETCH_ENABLED: bool = os.getenv("SPECULATIVE_PREFETCH_ENABLED", "false").lower() == "true"
+    # 执行智能体并行执行就绪任务的最大并发数
+    EXECUTOR_MAX_PARALLEL: int = int(os.getenv("EXECUTOR_MAX_PARALLEL", 3))
 
     class Config:
         case_sensitive = True
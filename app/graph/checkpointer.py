@@ -0,0 +1,426 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.config.settings import settings
+from app.graph.serializer import CompressedSerializer
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_updated ON threads (updated_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class _Row:
+    """
+    已序列化的检查点记录（热缓存中保存字节，避免与运行中的状态对象共享引用）
+    放入热缓存后不再修改：追加写入时复制writes生成新记录，读取方无需加锁即可遍历
+    """
+    __slots__ = ("checkpoint_id", "parent_id", "checkpoint", "metadata", "writes")
+
+    def __init__(self, checkpoint_id: str, parent_id: Optional[str], checkpoint: Tuple[str, bytes],
+                 metadata: Tuple[str, bytes], writes: Dict[Tuple[str, int], Tuple[str, str, Tuple[str, bytes]]]):
+        self.checkpoint_id = checkpoint_id
+        self.parent_id = parent_id
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.writes = writes  # (task_id, idx) -> (task_id, channel, typed_value)
+
+
+class BoundedSQLiteSaver(BaseCheckpointSaver[str]):
+    """
+    有界持久化检查点存储（SQLite）
+    - 会话（thread）超过ttl未更新即过期，读取时视为不存在，压缩时删除
+    - 每个会话只保留最近max_history个检查点
+    - 每隔compact_interval秒在写入时顺带压缩（删除过期会话、回收空间）
+    - 最近会话的最新检查点保存在有界热缓存中，读取时免去数据库查询
+    - 多个worker进程可共用同一数据库文件（WAL）：写事务加忙等待，其他进程提交过写入时清空本进程热缓存
+    - 写入在线程池中执行，热缓存的读写统一由_hot_lock保护（只包住字典操作，不含数据库I/O）
+    """
+
+    def __init__(self, path: str, ttl: float, max_history: int = 20, hot_cache_size: int = 256,
+                 compact_interval: float = 300, busy_timeout: int = 5000, *,
+                 serde: Optional[SerializerProtocol] = None):
+        """
+        :param path: 数据库文件路径（":memory:"为内存库）
+        :param ttl: 会话过期时间（秒）
+        :param max_history: 每个会话保留的检查点数量（至少2个，保证中断恢复可用）
+        :param hot_cache_size: 热缓存会话数
+        :param compact_interval: 压缩间隔（秒）
+        :param busy_timeout: 数据库被其他进程锁定时的等待时间（毫秒）
+        """
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl = ttl
+        self.max_history = max(2, max_history)
+        self.compact_interval = compact_interval
+        self.hot = TTLCache(max_size=hot_cache_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._hot_lock = threading.Lock()
+        self._last_compact = time.monotonic()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        self._db.executescript(_SCHEMA)
+        # 其他连接提交写入后data_version会变化，用于判断热缓存是否仍然有效
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # ------------------------------
+    # 内部读写（均在锁内执行）
+    # ------------------------------
+    def _is_expired(self, thread_id: str) -> bool:
+        row = self._db.execute("SELECT updated_at FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row is None or row[0] < time.time() - self.ttl
+
+    def _hot_get(self, key: Tuple[str, str], blocking: bool = True) -> Optional[_Row]:
+        """
+        读取热缓存；其他worker进程提交过写入时先清空热缓存，再由调用方从数据库读取
+        :param blocking: 是否等待数据库锁；事件循环上调用时传False，锁被写事务占用（可能在等待其他进程的
+                         busy_timeout）时直接视为未命中，交给线程池读取，不阻塞事件循环
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                with self._hot_lock:
+                    self.hot.clear()
+                return None
+        finally:
+            self._lock.release()
+        with self._hot_lock:
+            return self.hot.get(key)
+
+    def _hot_set(self, key: Tuple[str, str], row: _Row):
+        with self._hot_lock:
+            self.hot.set(key, row)
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Dict:
+        rows = self._db.execute(
+            "SELECT task_id, idx, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return {(task_id, idx): (task_id, channel, (type_, value)) for task_id, idx, channel, type_, value in rows}
+
+    def _load_row(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[_Row]:
+        if checkpoint_id:
+            row = self._db.execute(
+                "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id)
+            ).fetchone()
+        else:
+            row = self._db.execute(
+                "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        return _Row(checkpoint_id, parent_id, (type_, checkpoint), (metadata_type, metadata),
+                    self._load_writes(thread_id, checkpoint_ns, checkpoint_id))
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: _Row) -> CheckpointTuple:
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": row.checkpoint_id}},
+            checkpoint=self.serde.loads_typed(row.checkpoint),
+            metadata=self.serde.loads_typed(row.metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": row.parent_id}}
+                if row.parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value))
+                            for task_id, channel, value in row.writes.values()],
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """
+        写事务（调用方需持有self._lock）：开始即获取写锁，异常时回滚并重新抛出，
+        避免共享连接停留在未结束的事务中
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _delete_thread(self, thread_id: str):
+        for table in ("writes", "checkpoints", "threads"):
+            self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        with self._hot_lock:
+            self.hot.invalidate(lambda key: key[0] == thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """只保留最近max_history个检查点"""
+        cutoff = self._db.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_history)
+        ).fetchone()
+        if cutoff is None:
+            return
+        for table in ("writes", "checkpoints"):
+            self._db.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <= ?",
+                (thread_id, checkpoint_ns, cutoff[0])
+            )
+
+    def compact(self) -> int:
+        """
+        压缩：删除过期会话并回收空间
+        :return: 删除的会话数
+        """
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT thread_id FROM threads WHERE updated_at < ?", (time.time() - self.ttl,)
+            ).fetchall()]
+            with self._transaction():
+                for thread_id in expired:
+                    self._delete_thread(thread_id)
+            if self.path != ":memory:":
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._last_compact = time.monotonic()
+        if expired:
+            logger.info(f"检查点存储压缩完成：清理过期会话{len(expired)}个")
+        return len(expired)
+
+    def _maybe_compact(self):
+        if time.monotonic() - self._last_compact >= self.compact_interval:
+            self.compact()
+
+    # ------------------------------
+    # BaseCheckpointSaver 接口
+    # ------------------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        key = (thread_id, checkpoint_ns)
+        row: Optional[_Row] = self._hot_get(key)
+        if row is None or (checkpoint_id and row.checkpoint_id != checkpoint_id):
+            with self._lock:
+                if self._is_expired(thread_id):
+                    return None
+                row = self._load_row(thread_id, checkpoint_ns, checkpoint_id)
+            if row is None:
+                return None
+            if not checkpoint_id:
+                self._hot_set(key, row)
+        return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints"
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            keys = self._db.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, checkpoint_id in keys:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                row = self._load_row(thread_id, checkpoint_ns, checkpoint_id)
+            if row is None:
+                continue
+            item = self._to_tuple(thread_id, checkpoint_ns, row)
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        row = _Row(checkpoint["id"], parent_id, self.serde.dumps_typed(checkpoint),
+                   self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)), {})
+        with self._lock:
+            # 开始即获取写锁：多个worker并发写入时按busy_timeout排队，避免读事务升级写锁时失败
+            with self._transaction():
+                self._db.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, row.checkpoint_id, parent_id,
+                     row.checkpoint[0], row.checkpoint[1], row.metadata[0], row.metadata[1])
+                )
+                self._db.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+                self._prune(thread_id, checkpoint_ns)
+        self._hot_set((thread_id, checkpoint_ns), row)
+        self._maybe_compact()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((task_id, WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value)))
+        with self._lock:
+            with self._transaction():
+                for task_id_, idx, channel, (type_, value) in rows:
+                    # 特殊通道（idx<0，如中断/错误）可覆盖，普通写入已存在时忽略
+                    verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                    self._db.execute(
+                        f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, checkpoint_id, task_id_, idx, channel, type_, value, task_path)
+                    )
+        key = (thread_id, checkpoint_ns)
+        with self._hot_lock:
+            cached: Optional[_Row] = self.hot.get(key)
+            if cached is None or cached.checkpoint_id != checkpoint_id:
+                return
+            # 复制后替换，不修改读取方可能正在遍历的记录
+            writes = dict(cached.writes)
+            for task_id_, idx, channel, value in rows:
+                if idx < 0 or (task_id_, idx) not in writes:
+                    writes[(task_id_, idx)] = (task_id_, channel, value)
+            self.hot.set(key, _Row(cached.checkpoint_id, cached.parent_id, cached.checkpoint, cached.metadata, writes))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            with self._transaction():
+                self._delete_thread(thread_id)
+
+    # 异步接口：数据库操作放到线程池执行，避免阻塞事件循环；热缓存命中时直接返回
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = (config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        checkpoint_id = get_checkpoint_id(config)
+        row: Optional[_Row] = self._hot_get(key, blocking=False)
+        if row is not None and (not checkpoint_id or row.checkpoint_id == checkpoint_id):
+            return self._to_tuple(key[0], key[1], row)
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items: List[CheckpointTuple] = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # 与MemorySaver一致的版本号格式
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            threads = self._db.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            checkpoints = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        with self._hot_lock:
+            hot = self.hot.stats()
+        return {"threads": threads, "checkpoints": checkpoints, "hot": hot}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def build_checkpointer() -> BaseCheckpointSaver:
+    """按配置创建检查点存储：sqlite（默认，有界持久化）或 memory（进程内，无上限，仅用于调试）"""
+    serde = CompressedSerializer(
+        threshold=settings.CHECKPOINT_COMPRESS_THRESHOLD,
+        level=settings.CHECKPOINT_COMPRESS_LEVEL
+    )
+    if settings.CHECKPOINT_BACKEND == "memory":
+        return MemorySaver(serde=serde)
+    return BoundedSQLiteSaver(
+        path=settings.CHECKPOINT_DB_PATH,
+        ttl=settings.CONTEXT_EXPIRE_TIME,
+        max_history=settings.CHECKPOINT_MAX_HISTORY,
+        hot_cache_size=settings.CHECKPOINT_HOT_CACHE_SIZE,
+        compact_interval=settings.CHECKPOINT_COMPACT_INTERVAL,
+        busy_timeout=settings.CHECKPOINT_BUSY_TIMEOUT,
+        serde=serde
+    )
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+
+from app.config.settings import settings
+from app.utils.logger import logger
+
+
+class HistoryWindow:
+    """
+    会话历史窗口：每轮对话入口按消息数或token数保留最近的完整对话轮次，更早的消息移出状态
+    """
+
+    def __init__(self, mode: str = "messages", max_messages: int = 50, max_tokens: int = 4000,
+                 max_views: int = 20, encoding_name: str = "cl100k_base"):
+        """
+        :param mode: 窗口模式：messages（按消息数）/tokens（按token数）/off（不裁剪）
+        :param max_messages: 按消息数保留的最大消息数
+        :param max_tokens: 按token数保留的最大token数
+        :param max_views: 保留的最大表单视图数（当前表单始终保留）
+        :param encoding_name: tiktoken编码名称
+        """
+        self.mode = mode
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.max_views = max_views
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._encoding_loaded = False
+
+    def _get_encoding(self):
+        """首次按token计数时才加载tiktoken编码，加载失败（如离线环境无法下载编码文件）时按字数估算"""
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken编码{self.encoding_name}加载失败，按字数估算token：{str(e)}")
+        return self._encoding
+
+    def count_tokens(self, message: BaseMessage) -> int:
+        """
+        计算单条消息的token数
+        :param message: 消息
+        :return: token数（中文约一字一token）
+        """
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        encoding = self._get_encoding()
+        if encoding is None:
+            return len(content)
+        return len(encoding.encode(content, disallowed_special=()))
+
+    def select_evicted(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        计算需要移出窗口的消息：超出上限时裁剪到上限的一半（避免每轮都裁剪），
+        从最新消息向前累计，截断点对齐到对话轮次开头（HumanMessage），当前轮单独超出时保留当前轮
+        :param messages: 会话历史消息
+        :return: 需要移出的最早的若干条消息
+        """
+        if self.mode == "messages":
+            if len(messages) <= self.max_messages:
+                return []
+            cut = len(messages) - self.max_messages // 2
+        elif self.mode == "tokens":
+            tokens = [self.count_tokens(message) for message in messages]
+            if sum(tokens) <= self.max_tokens:
+                return []
+            total = 0
+            cut = 0
+            for index in range(len(messages) - 1, -1, -1):
+                total += tokens[index]
+                if total > self.max_tokens // 2:
+                    cut = index + 1
+                    break
+        else:
+            return []
+
+        human_indexes = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if human_indexes:
+            cut = next((i for i in human_indexes if i >= cut), human_indexes[-1])
+        return messages[:cut]
+
+    def trim_views(self, views: Optional[Dict[str, Dict]], keep_model_id: str) -> Optional[Dict[str, Dict]]:
+        """
+        保留最近的表单视图（按写入顺序），当前表单始终保留
+        :return: 裁剪后的视图；无需裁剪时返回None
+        """
+        if not views or len(views) <= self.max_views:
+            return None
+        keep_ids = list(views)[-self.max_views:]
+        if keep_model_id in views and keep_model_id not in keep_ids:
+            keep_ids = keep_ids[1:] + [keep_model_id]
+        return {model_id: views[model_id] for model_id in views if model_id in keep_ids}
+
+    def apply(self, state) -> Dict[str, Any]:
+        """
+        每轮对话入口裁剪会话状态
+        :param state: 会话状态
+        :return: 状态更新（移出消息的RemoveMessage、裁剪后的视图、清空上一轮的应用模板列表），无需更新时为空字典
+        """
+        if self.mode == "off":
+            return {}
+        updates: Dict[str, Any] = {}
+        evicted = self.select_evicted(state.messages)
+        if evicted:
+            updates["messages"] = [RemoveMessage(id=message.id) for message in evicted]
+            logger.info(f"会话{state.session_id}：历史窗口移出{len(evicted)}条消息，保留{len(state.messages) - len(evicted)}条")
+        views = self.trim_views(state.views, state.model_id)
+        if views is not None:
+            updates["views"] = views
+        if state.app_templates:
+            # 应用模板列表只在模板查询到模板选择之间使用，新一轮开始时清空
+            updates["app_templates"] = []
+        return updates
+
+
+# 全局实例
+history_window = HistoryWindow(
+    mode=settings.HISTORY_WINDOW_MODE,
+    max_messages=settings.HISTORY_MAX_MESSAGES,
+    max_tokens=settings.HISTORY_MAX_TOKENS,
+    max_views=settings.HISTORY_MAX_VIEWS,
+    encoding_name=settings.HISTORY_TOKEN_ENCODING
+)
@@ -1,15 +1,24 @@
 # 可放在 app/graph/hooks.py（新建钩子文件）或直接放在 lcai 接口文件中
+import asyncio
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.errors import GraphBubbleUp, GraphInterrupt
+
 from app.models.state import LCAIState
+from app.utils.metrics import NODE_CANCELLED, NODE_DURATION, NODE_ERRORS, NODE_IN_FLIGHT, NODE_INTERRUPTS
+from app.utils.timing import record_stage
 
-# 1. 节点-进度提示映射字典（与之前一致，可按需扩展）
+# 1. 节点-进度提示映射字典（key为流程图中注册的节点名，可按需扩展）
 NODE_PROGRESS_TIPS = {
-    "app_template_query_node": "正在查询应用模板...",
-    "planner_node": "正在生成任务规划...",
-    "human_node": "正在等待用户确认...",
-    "execute_task_node": "正在执行任务...",
-    "save_form_node": "正在保存表单数据...",
+    "intent_recognition": "正在识别需求...",
+    "app_template_query": "正在查询应用模板...",
+    "planner_agent": "正在生成任务规划...",
+    "human_confirm": "正在等待用户确认...",
+    "executor_agent": "正在执行任务...",
+    "form_build": "正在设计表单...",
+    "form_modify": "正在修改表单...",
 }
 
 # 2. 定义节点前置钩子（pre 钩子：节点执行前触发）
@@ -33,19 +42,59 @@ async def node_pre_hook(state: LCAIState, config: Dict[str, Any], node_info: Dic
         f"正在执行【{node_name}】节点..."
     )
 
-    # 构建进度提示数据（与前端解析格式一致）
-    progress_info = {
-        "type": "progress",
-        "node": node_name,
-        "tip": progress_tip,
-        "time": time.strftime('%Y-%m-%d %H:%M:%S'),
-        "finished": False,
-        "session_id": state.session_id
-    }
-
     # 将进度提示添加到状态的 progress_tips 列表中
     state.progress_tips = progress_tip
-    print(f"【钩子触发】节点 {node_name} 即将执行，进度提示：{progress_tip}")
 
     # 返回更新后的状态（LangGraph 会使用该状态执行节点）
-    return state
\ No newline at end of file
+    return state
+
+
+# 3. 定义节点后置钩子（post 钩子：节点执行后触发）
+async def node_post_hook(state: LCAIState, config: Dict[str, Any], node_info: Dict[str, Any], duration: float,
+                         error: Optional[BaseException] = None) -> None:
+    """
+    LangGraph 节点后置钩子：记录节点耗时、异常、取消及中断次数
+    :param duration: 节点耗时（秒）
+    :param error: 节点抛出的异常（正常结束为None）
+    """
+    node_name = node_info["node_id"]
+    NODE_IN_FLIGHT.dec(node=node_name)
+    record_stage(f"node:{node_name}", duration)
+    if isinstance(error, GraphInterrupt):
+        # 中断是等待用户输入，不计入耗时与异常（恢复后节点会重新执行）
+        NODE_INTERRUPTS.inc(node=node_name)
+        return
+    NODE_DURATION.observe(duration, node=node_name)
+    if isinstance(error, asyncio.CancelledError):
+        # 客户端断开后流程被取消，节点输出不写入检查点
+        NODE_CANCELLED.inc(node=node_name)
+    elif isinstance(error, Exception) and not isinstance(error, GraphBubbleUp):
+        NODE_ERRORS.inc(node=node_name)
+
+
+# 4. 为节点挂载前置/后置钩子（注册节点时包装节点函数）
+def with_hooks(node_name: str, node_fn: Callable[[LCAIState], Awaitable[Dict[str, Any]]]):
+    """
+    包装节点函数：执行前调用node_pre_hook，执行后（含异常）调用node_post_hook
+    :param node_name: 流程图中注册的节点名
+    :param node_fn: 节点函数
+    :return: 带钩子的节点函数
+    """
+    node_info = {"node_id": node_name}
+
+    # 不使用functools.wraps：LangGraph按函数签名判断是否传入config，需保留包装函数自身的签名
+    async def hooked_node(state: LCAIState, config: RunnableConfig) -> Dict[str, Any]:
+        state = await node_pre_hook(state, config, node_info)
+        NODE_IN_FLIGHT.inc(node=node_name)
+        start = time.perf_counter()
+        try:
+            result = await node_fn(state)
+        except BaseException as e:
+            await node_post_hook(state, config, node_info, time.perf_counter() - start, e)
+            raise
+        await node_post_hook(state, config, node_info, time.perf_counter() - start)
+        return result
+
+    hooked_node.__name__ = node_fn.__name__
+    hooked_node.__doc__ = node_fn.__doc__
+    return hooked_node
@@ -1,9 +1,9 @@
-from langchain_core.messages import SystemMessage, AIMessage
+import asyncio
+
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langchain_core.runnables.graph import MermaidDrawMethod
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any
 
 from requests_toolbelt import user_agent
 
@@ -11,9 +11,10 @@ from app.agents.executor_agent import executor_agent
 from app.agents.form_modify_agent import form_modify_agent
 from app.agents.planner_agent import planner_agent
 from app.config.settings import settings
-from app.models.state import LCAIState
+from app.models.state import LCAIState, TaskPlan
 
 from app.agents.intent_agent import intent_agent
+from app.agents.understand_agent import understand_agent
 from app.agents.qa_agent import qa_agent
 from app.agents.appname_extract_agent import app_name_extract_agent
 from app.agents.app_template_query_agent import app_template_query_agent
@@ -22,33 +23,80 @@ from app.agents.form_build_agent import form_build_agent
 
 from app.utils.logger import logger
 from app.utils.exceptions import IntentRecognitionError, AppnameRecognitionError, AppGenerateError, PlanningError
+from langgraph.config import get_stream_writer
 from langgraph.types import interrupt, Command
 from langgraph.types import Command
-from app.graph.hooks import node_pre_hook  # 导入前置钩子
+from app.graph.hooks import with_hooks  # 节点前置/后置钩子（进度提示、耗时指标）
+from app.graph.checkpointer import build_checkpointer
+from app.graph.history import history_window
 from app.utils.website import get_app_run_url
 
 
 # ------------------------------
 # 1. 定义节点函数
 # ------------------------------
+async def prefetch_app_build(state: LCAIState) -> Dict[str, Any]:
+    """预取app_build路径的应用名称及应用模板（与意图识别并发执行）"""
+    app_name = await app_name_extract_agent.recognize_appname(user_input=state.user_input, chatId=state.session_id)
+    app_templates = await app_template_query_agent.query_app_templates(appName=app_name, meta=state.meta)
+    return {"app_name": app_name, "app_templates": app_templates}
+
+
+async def commit_prefetch(prefetch_task: asyncio.Task, commit: bool) -> Dict[str, Any]:
+    """
+    意图识别完成后处理预取任务：需要提交时等待结果，否则取消
+    :return: 预取结果；未提交或预取失败时返回空字典（由后续节点按原流程执行）
+    """
+    if not commit:
+        prefetch_task.cancel()
+        return {}
+    try:
+        return await prefetch_task
+    except Exception as e:
+        logger.warning(f"预取应用名称及模板失败，按原流程执行：{str(e)}")
+        return {}
+
+
 async def intent_recognition_node(state: LCAIState) -> Dict[str, Any]:
-    """意图识别节点：判断用户意图类型"""
+    """意图识别节点：判断用户意图类型（每轮入口，同时按历史窗口裁剪会话状态）"""
+    prefetch_task = None
+    history_updates = history_window.apply(state)
+    removed_messages = history_updates.pop("messages", [])
     try:
-        intent_type = await intent_agent.recognize_intent(user_input=state.user_input, chatId=state.session_id)
+        understanding = None
+        prefetched = {}
+        if settings.FUSED_UNDERSTANDING_ENABLED:
+            # 合并提取：一次调用得到意图、应用名、检索关键词及表单提示
+            understanding = await understand_agent.understand(user_input=state.user_input, chatId=state.session_id)
+            intent_type = understanding.intent_type
+        else:
+            if settings.SPECULATIVE_PREFETCH_ENABLED:
+                prefetch_task = asyncio.create_task(prefetch_app_build(state))
+            intent_type = await intent_agent.recognize_intent(user_input=state.user_input, chatId=state.session_id)
+            if prefetch_task:
+                prefetched = await commit_prefetch(prefetch_task, intent_type == "app_build")
         return {
+            **history_updates,
             "intent_type": intent_type,
             "intent_desc": f"识别到用户意图类型：{intent_type}",
-            "messages": add_messages(state.messages, [SystemMessage(content=f"意图识别结果：{intent_type}")])
+            "understanding": understanding,
+            "prefetched": prefetched,
+            "messages": removed_messages + [SystemMessage(content=f"意图识别结果：{intent_type}")]
         }
     except IntentRecognitionError as e:
         logger.error(f"意图识别节点失败：{str(e)}")
         return {
+            **history_updates,
             "intent_type": "unknown",
             "intent_desc": f"意图识别失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages,
-                                     [AIMessage(content=f"抱歉，无法识别您的需求：{str(e)}")])
+            "understanding": None,
+            "prefetched": {},
+            "messages": removed_messages + [AIMessage(content=f"抱歉，无法识别您的需求：{str(e)}")]
         }
+    finally:
+        if prefetch_task and not prefetch_task.done():
+            prefetch_task.cancel()
 
 
 async def planner_node(state: LCAIState) -> Dict[str, Any]:
@@ -57,25 +105,25 @@ async def planner_node(state: LCAIState) -> Dict[str, Any]:
         plan = await planner_agent.make_plan(user_input=state.user_input, chat_id=state.session_id)
 
         return {
-            "execution_plan": plan,
+            "execution_plan": TaskPlan(tasks=plan),  # 新计划整体替换旧计划
             "msg": "",
             "invoke_confirm_node": "planner_node" if len(plan) > 0 else ""
         }
     except PlanningError as e:
         logger.error(f"任务规划节点失败：{str(e)}")
         return {
-            "execution_plan": [],
+            "execution_plan": TaskPlan(),
             "intent_desc": f"任务规划失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages,
-                                     [AIMessage(content=f"抱歉，任务规划失败：{str(e)}")])
+            "messages": [AIMessage(content=f"抱歉，任务规划失败：{str(e)}")]
         }
 
 
 async def executor_node(state: LCAIState) -> Dict[str, Any]:
     """执行节点：调度执行子任务队列"""
     try:
-        # 调用 ExecutorAgent 准备下一步队列任务
+        # 调用 ExecutorAgent 准备下一步队列任务（记录执行前的任务状态，用于只返回变化的任务）
+        snapshot = executor_agent.snapshot_tasks(state)
         next_step_info = await executor_agent.execute_next_step(state)
         # 提取状态更新内容
         # 返回状态更新（包含下一步跳转节点信息）
@@ -85,41 +133,52 @@ async def executor_node(state: LCAIState) -> Dict[str, Any]:
             "planner_feedback": next_step_info.get("planner_feedback"),
             "goto": next_step_info.get("next_node"),
             "finished": next_step_info.get("finished", False),
-            "messages": next_step_info.get("messages", state.messages),
-            "execution_plan": state.execution_plan,  # 同步更新后的任务队列
-            "executing_plan": next_step_info.get("executing_plan", False)  # 同步更新后的任务队列
+            "messages": next_step_info.get("messages", []),
+            "execution_plan": executor_agent.changed_tasks(state, snapshot),  # 仅同步状态变化的任务
+            "executing_plan": next_step_info.get("executing_plan", False),  # 同步更新后的任务队列
+            **next_step_info.get("state_updates", {})  # 并行执行任务的合并结果
         }
     except Exception as e:
         logger.error(f"执行节点执行失败：{str(e)}")
         return {
             "finished": True,
             "planner_feedback": f"执行节点执行失败：{str(e)}",
-            "messages": add_messages(state.messages, [AIMessage(content=f"抱歉，任务执行失败：{str(e)}")])
+            "messages": [AIMessage(content=f"抱歉，任务执行失败：{str(e)}")]
         }
 
 
-async def qa_agent_node(state: LCAIState) -> AsyncGenerator[Dict, None]:
-    """低代码问答节点：处理问答类需求"""
+async def qa_agent_node(state: LCAIState) -> Dict[str, Any]:
+    """
+    低代码问答节点：处理问答类需求
+    增量模式下每个片段以带序号的delta实时推送（custom流），完整回答只在结束时写入一次messages
+    """
     try:
         # 调用问答智能体，获取流式生成器
         qa_result = await qa_agent.answer(user_input=state.user_input, chatId=state.session_id, stream=True)
         stream_generator = qa_result.get("stream")
-        answer = ""
+        chunks = []
         if stream_generator:
-            # 逐段yield增量内容（核心：每一个chunk都实时返回）
+            writer = get_stream_writer() if state.delta_stream else None
             async for chunk in stream_generator:
-                answer = answer + chunk
-                # print(f"DS返回：{chunk}")
-                yield {
-                    "node": "qa_agent",
-                    "messages": add_messages(state.messages, [AIMessage(content=answer)]),
-                    "msg": answer,
-                    "finished": False,
-                }
+                chunks.append(chunk)
+                if writer:
+                    writer({
+                        "type": "delta",
+                        "node": "qa_agent",
+                        "seq": len(chunks),
+                        "delta": chunk,
+                        "finished": False,
+                    })
+        answer = "".join(chunks)
+        return {
+            "node": "qa_agent",
+            "messages": [AIMessage(content=answer)],
+            "msg": answer,
+            "finished": False,
+        }
     except Exception as e:
         logger.error(f"问答节点失败：{e}")
-        # 异常兜底yield
-        yield {
+        return {
             "code": -1,
             "node": "qa_agent",
             "msg": f"问答失败：{e}",
@@ -130,11 +189,18 @@ async def qa_agent_node(state: LCAIState) -> AsyncGenerator[Dict, None]:
 async def appname_extract_node(state: LCAIState) -> Dict[str, Any]:
     """应用名提取节点：根据用户需求提取出应用名称"""
     try:
-        app_name = await app_name_extract_agent.recognize_appname(user_input=state.user_input, chatId=state.session_id)
+        app_name = state.prefetched.get("app_name")
+        if app_name:
+            logger.info(f"使用预取的应用名称：{app_name}")
+        elif state.understanding and state.understanding.app_name:
+            app_name = state.understanding.app_name
+            logger.info(f"使用需求理解结果中的应用名称：{app_name}")
+        else:
+            app_name = await app_name_extract_agent.recognize_appname(user_input=state.user_input, chatId=state.session_id)
         return {
             "app_name": app_name,
             "msg": f"已提取到应用名：[{app_name}], 正在查询相关的应用模板...",
-            "messages": add_messages(state.messages, [SystemMessage(content=f"应用名提取结果：{app_name}")])
+            "messages": [SystemMessage(content=f"应用名提取结果：{app_name}")]
         }
     except AppnameRecognitionError as e:
         logger.error(f"应用名提取节点失败：{str(e)}")
@@ -142,21 +208,27 @@ async def appname_extract_node(state: LCAIState) -> Dict[str, Any]:
             "app_name": "unknown",
             "desc": f"意图识别失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages,
-                                     [AIMessage(content=f"应用名提取节点失败：{str(e)}")])
+            "messages": [AIMessage(content=f"应用名提取节点失败：{str(e)}")]
         }
 
 
 async def app_template_query_node(state: LCAIState) -> Dict[str, Any]:
     """应用模板查询节点：根据应用名称查询相关应用模板"""
     try:
-        app_templates = await app_template_query_agent.query_app_templates(appName=state.app_name, meta=state.meta)
+        if "app_templates" in state.prefetched and state.prefetched.get("app_name") == state.app_name:
+            app_templates = state.prefetched["app_templates"]
+            logger.info(f"使用预取的应用模板：{state.app_name}，模板数：{len(app_templates)}")
+        elif state.understanding and state.understanding.keywords:
+            app_templates = await app_template_query_agent.query_app_templates(
+                appName=state.app_name, meta=state.meta, keywords=state.understanding.keywords)
+        else:
+            app_templates = await app_template_query_agent.query_app_templates(appName=state.app_name, meta=state.meta)
         # 组织返回消息
         template_names = [template["templateCname"] for template in app_templates]
         return {
             "app_templates": app_templates,
-            "messages": add_messages(state.messages,
-                                     [SystemMessage(content=f"共获取到：{len(template_names)}个应用模板。")]),
+            "prefetched": {},  # 预取结果仅使用一次
+            "messages": [SystemMessage(content=f"共获取到：{len(template_names)}个应用模板。")],
             "msg": "",
             "invoke_confirm_node": "app_template_query_node" if len(template_names) > 0 else ""
         }
@@ -166,8 +238,7 @@ async def app_template_query_node(state: LCAIState) -> Dict[str, Any]:
             "app_name": "unknown",
             "desc": f"意图识别失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages,
-                                     [AIMessage(content=f"应用名提取节点失败：{str(e)}")])
+            "messages": [AIMessage(content=f"应用名提取节点失败：{str(e)}")]
         }
 
 
@@ -189,7 +260,7 @@ async def app_create_node(state: LCAIState) -> Dict[str, Any]:
         return {
             "app_id": app_info["app_id"],
             "app_name": app_info["app_name"],
-            "messages": add_messages(state.messages, [SystemMessage(content=f"应用创建成功:[{app_info["app_name"]}]")]),
+            "messages": [SystemMessage(content=f"应用创建成功:[{app_info["app_name"]}]")],
             "msg": msg,
             "website": website
         }
@@ -199,32 +270,45 @@ async def app_create_node(state: LCAIState) -> Dict[str, Any]:
             "app_name": "unknown",
             "desc": f"应用创建失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages, [AIMessage(content=f"应用创建失败：{str(e)}")])
+            "messages": [AIMessage(content=f"应用创建失败：{str(e)}")]
         }
 
 
 async def form_build_node(state: LCAIState) -> Dict[str, Any]:
     """创建一个新的表单"""
     try:
-        model_info = await form_build_agent.build_form(state=state, form_name="", form_prompt="")
+        form_name, field_requirements = "", ""
+        if not state.executing_plan and state.understanding and state.understanding.forms:
+            # 使用需求理解结果中的表单提示，省去字段要求提取调用
+            form_name = state.understanding.forms[0].form_name
+            field_requirements = state.understanding.forms[0].field_requirements or "无"
+        model_info = await form_build_agent.build_form(state=state, form_name=form_name, form_prompt="",
+                                                       field_requirements=field_requirements)
         # 组织返回消息
         model_id = model_info["model_id"]
         form_name = model_info["form_name"]
-        return {
+        updates = {
             "model_id": model_id,
             "form_name": form_name,
             "views": model_info["views"],
-            "messages": add_messages(state.messages, [SystemMessage(content=f"表单创建成功:[{form_name}]")]),
+            "messages": [SystemMessage(content=f"表单创建成功:[{form_name}]")],
             "msg": f"表单【{form_name}({model_id})】创建成功！",
             "website": get_app_run_url(state.meta.origin, state.meta.cur_workspaceId, state.app_id)
         }
+        if state.executing_plan:
+            # 记录本任务的执行结果，执行器据此校验任务是否成功
+            task = next((t for t in state.execution_plan if t.task_id == state.current_task_id), None)
+            if task is not None:
+                updates["execution_plan"] = [task.model_copy(
+                    update={"task_output": {"model_id": model_id, "form_name": form_name}})]
+        return updates
     except AppGenerateError as e:
         logger.error(f"应用创建失败：{str(e)}")
         return {
             "app_name": "unknown",
             "desc": f"应用创建失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages, [AIMessage(content=f"应用创建失败：{str(e)}")])
+            "messages": [AIMessage(content=f"应用创建失败：{str(e)}")]
         }
 
 
@@ -246,7 +330,7 @@ async def form_modify_node(state: LCAIState) -> Dict[str, Any]:
             "app_name": "unknown",
             "desc": f"应用创建失败：{str(e)}",
             "finished": True,
-            "messages": add_messages(state.messages, [AIMessage(content=f"应用创建失败：{str(e)}")])
+            "messages": [AIMessage(content=f"应用创建失败：{str(e)}")]
         }
 
 
@@ -288,7 +372,7 @@ async def human_node(state: LCAIState) -> Dict[str, Any]:
     )
     goto = ""
     params = {}
-    print(f"\n\n\n会话：{state.meta.chatId}恢复执行！用户输入：{action}")
+    logger.info(f"会话{state.session_id}：恢复执行，用户输入：{action}")
 
     if state.invoke_confirm_node == "app_template_query_node":
         """询问用户是否使用模板"""
@@ -330,12 +414,13 @@ async def chat_listener_node(state: LCAIState) -> Dict[str, Any]:
         }
     )
     # 监听恢复：
-    print(f"\n\n\n会话：{state.meta.chatId}恢复执行！用户输入：{user_input}")
+    logger.info(f"会话{state.session_id}：恢复执行，用户输入：{user_input}")
 
     return {
         "paused": False,
         "pause_at": "",
         "user_input": user_input,
+        "messages": [HumanMessage(content=user_input)],
         #重置参数：
         "choose_app_template": -1,
     }
@@ -432,18 +517,18 @@ def build_lcai_graph():
         validate=False  # 启用状态校验（可选，增强类型检查）
     )
 
-    ## 1/3 注册节点
-    graph.add_node("intent_recognition", intent_recognition_node)
-    graph.add_node("planner_agent", planner_node)
-    graph.add_node("executor_agent", executor_node)
-    graph.add_node("qa_agent", qa_agent_node)
-    graph.add_node("app_name_extract", appname_extract_node)
-    graph.add_node("app_template_query", app_template_query_node)
-    graph.add_node("app_create", app_create_node)
-    graph.add_node("form_build", form_build_node)
-    graph.add_node("form_modify", form_modify_node)
-    graph.add_node("human_confirm", human_node)
-    graph.add_node("chat_listener", chat_listener_node)
+    ## 1/3 注册节点（挂载前置/后置钩子）
+    graph.add_node("intent_recognition", with_hooks("intent_recognition", intent_recognition_node))
+    graph.add_node("planner_agent", with_hooks("planner_agent", planner_node))
+    graph.add_node("executor_agent", with_hooks("executor_agent", executor_node))
+    graph.add_node("qa_agent", with_hooks("qa_agent", qa_agent_node))
+    graph.add_node("app_name_extract", with_hooks("app_name_extract", appname_extract_node))
+    graph.add_node("app_template_query", with_hooks("app_template_query", app_template_query_node))
+    graph.add_node("app_create", with_hooks("app_create", app_create_node))
+    graph.add_node("form_build", with_hooks("form_build", form_build_node))
+    graph.add_node("form_modify", with_hooks("form_modify", form_modify_node))
+    graph.add_node("human_confirm", with_hooks("human_confirm", human_node))
+    graph.add_node("chat_listener", with_hooks("chat_listener", chat_listener_node))
 
     # 设置入口节点
     graph.set_entry_point("intent_recognition")
@@ -481,6 +566,7 @@ def build_lcai_graph():
             "app_create": "app_create",
             "form_build": "form_build",
             "human_confirm": "human_confirm",
+            "executor_agent": "executor_agent",
             END: "chat_listener"
         }
     )
@@ -554,8 +640,8 @@ def build_lcai_graph():
         }
     )
 
-    # 记忆初始化
-    memory = MemorySaver()
+    # 记忆初始化（有界持久化检查点存储，按CHECKPOINT_BACKEND配置）
+    memory = build_checkpointer()
 
     # 编译LangGraph流程图
     app = graph.compile(checkpointer=memory)
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager  # 新增：用于定义lifespan
 from app.config.settings import settings
 from app.api.v1.lcai import router as lcai_router
@@ -19,8 +20,13 @@ async def lifespan(app: FastAPI):
     logger.info("LCAI服务开始关闭，释放资源...")
     from app.services.ds_platform import ds_client
     from app.services.form_storage import form_storage_client
+    from app.services.sbe_client import sbe_client
     await ds_client.close()
     await form_storage_client.close()
+    await sbe_client.close()
+    from app.graph.lcai_graph import lcai_graph
+    if hasattr(lcai_graph.checkpointer, "close"):
+        lcai_graph.checkpointer.close()
     logger.info("LCAI服务已关闭，资源释放完成")
 
 # ------------------------------
@@ -54,17 +60,26 @@ async def health_check():
         "version": "0.114.514"
     }
 
+# 监控指标接口（Prometheus文本格式，各worker进程分别统计，以worker标签区分）
+@app.get("/metrics", tags=["健康检查"])
+async def metrics_endpoint():
+    from app.utils.metrics import metrics
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ------------------------------
 # 3. 启动服务
 # ------------------------------
 if __name__ == "__main__":
     import uvicorn  # 此处导入需确保uvicorn已安装
-    logger.info(f"启动LCAI服务：http://{settings.API_HOST}:{settings.API_PORT}")
+    logger.info(f"启动LCAI服务：http://{settings.API_HOST}:{settings.API_PORT}，worker数：{settings.API_WORKERS}")
+    if settings.API_WORKERS > 1 and settings.CHECKPOINT_BACKEND == "memory":
+        # 进程内存储无法跨worker共享，/confirm落到其他worker时会丢失会话
+        raise ValueError("多worker部署须将CHECKPOINT_BACKEND配置为sqlite")
     uvicorn.run(
         "app.main:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
-        reload=True,  # 开发环境开启热重载，生产环境关闭
-        workers=1,    # 生产环境可改为CPU核心数（如4）
+        reload=settings.API_RELOAD and settings.API_WORKERS == 1,  # 开发环境开启热重载（仅单进程），生产环境关闭
+        workers=settings.API_WORKERS,  # 生产环境可改为CPU核心数（如4），检查点存储由各worker共用
         log_level="info"
     )
\ No newline at end of file
@@ -34,6 +34,8 @@ class LCAIRequest(BaseModel):
     user_input: str = Field(..., description="用户输入的自然语言需求")
     meta: LCAIMeta = Field(..., description="元数据（对话及场景信息），必填")  # 核心：meta为必填项
     stream: Optional[bool] = Field(default=False, description="是否流式响应")
+    delta_stream: Optional[bool] = Field(default=False, description="问答回答是否按增量片段（带序号）流式返回")
+    debug_timing: Optional[bool] = Field(default=False, description="是否返回各阶段耗时（流式附加在end帧，同步调用为Server-Timing响应头）")
 
 
 # API响应模型
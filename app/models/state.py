@@ -1,13 +1,15 @@
 # app/models/state.py
 from pydantic import BaseModel, Field
-from typing import Optional, Literal, List, Any, Dict
+from typing import Optional, Literal, List, Any, Dict, Union, Annotated
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage  # 标准消息类型
+from langgraph.graph.message import add_messages
 from app.models.schema import FormSchema, LCAIMeta  # 你的表单Schema类
 
 
 # 1. 自定义带messages的基础状态类（替代LangGraph旧版MessagesState）
 class BaseLCAIState(BaseModel):
-    messages: List[BaseMessage] = Field(default_factory=list, description="对话消息列表")
+    # 带reducer的通道：节点只返回新增消息，由add_messages追加到历史（按消息id去重/替换）
+    messages: Annotated[List[BaseMessage], add_messages] = Field(default_factory=list, description="对话消息列表")
     session_id: str = Field(..., description="会话ID")
     user_input: str = Field(..., description="用户当前输入")
     meta: Optional[LCAIMeta] = Field(default=None, description="低代码元数据")
@@ -26,11 +28,40 @@ class Task(BaseModel):
     status: Literal["pending", "running", "success", "failed", "need_human"]
     # 6. 任务执行结果（节点运行后的输出，比如intent_recognition返回的intent_type）
     task_output: Optional[Dict] = None
+    # 7. 依赖的任务ID（依赖全部成功后才可执行，无依赖的就绪任务可并行执行）
+    depends_on: List[int] = Field(default_factory=list, description="依赖的任务ID列表")
 
 # 新增：TaskPlan 包装类（必须直接继承 BaseModel，无泛型嵌套问题）
 class TaskPlan(BaseModel):
     tasks: List[Task] = Field(default_factory=list, description="有序子任务列表")
 
+def merge_tasks(left: List[Task], right: Union[List[Task], TaskPlan]) -> List[Task]:
+    """
+    执行计划reducer：节点只返回状态变化的任务，按task_id替换已有任务，新任务追加到末尾
+    :param left: 当前执行计划
+    :param right: 变化的任务列表；为TaskPlan时整体替换（规划节点生成新计划）
+    :return: 合并后的执行计划
+    """
+    if isinstance(right, TaskPlan):
+        return list(right.tasks)
+    if not right:
+        return left
+    changed = {task.task_id: task for task in right}
+    merged = [changed.pop(task.task_id, task) for task in left]
+    merged.extend(changed.values())
+    return merged
+
+# 需求理解（一次LLM调用同时提取意图、应用名、检索关键词、表单提示）
+class FormHint(BaseModel):
+    form_name: str = Field(default="", description="表单名称")
+    field_requirements: str = Field(default="", description="用户提到的字段要求，中文字段名逗号分隔，没有则为空")
+
+class RequestUnderstanding(BaseModel):
+    intent_type: Literal["qa", "app_build", "complex", "form_modify", "human_confirm", "unknown"] = Field(..., description="意图类型")
+    app_name: str = Field(default="", description="应用名称（不包含“应用”“系统”“平台”等泛化词）")
+    keywords: List[str] = Field(default_factory=list, description="应用模板检索关键词（2字核心词为主）")
+    forms: List[FormHint] = Field(default_factory=list, description="用户提到的表单及字段要求")
+
 # 3. 扩展核心状态类（纯Pydantic模型，无TypedDict）
 class LCAIState(BaseLCAIState):
     # 意图识别结果
@@ -42,9 +73,13 @@ class LCAIState(BaseLCAIState):
     node: str = Field(default="unknown", description="发消息的节点")
     msg: Optional[str] = Field(default=None, description="回答内容")
     intermediate_messages: List = Field(default_factory=list, description="中间返回消息")
+    delta_stream: bool = Field(default=False, description="问答回答是否按增量片段流式返回")
+    # 需求理解结果（合并提取模式下由意图识别节点写入）
+    understanding: Optional[RequestUnderstanding] = Field(default=None, description="需求理解结果")
     # 应用相关数据
     app_id: str = Field(default="", description="应用id")
     app_name: str = Field(default="", description="应用名称")
+    prefetched: Dict[str, Any] = Field(default_factory=dict, description="意图识别时预取的应用名称与应用模板（仅app_build意图提交）")
     # 应用模板数据
     app_templates: List = Field(default_factory=list, description="应用模板列表")
     choose_app_template: int = Field(default=-1, description="用户选择的应用模板号")
@@ -72,7 +107,7 @@ class LCAIState(BaseLCAIState):
     goto: str = Field(default="", description="要跳转到的节点id")
     # 规划智能体新增字段
     executing_plan: bool = Field(default=False, description="执行智能体是否运行中")
-    execution_plan: List[Task] = Field(default_factory=list)  # 执行计划（子任务列表）
+    execution_plan: Annotated[List[Task], merge_tasks] = Field(default_factory=list)  # 执行计划（子任务列表，按task_id合并）
     current_task_id: Optional[int] = None  # 当前执行的任务ID
     planner_feedback: Optional[str] = None  # 规划智能体的反馈/调整说明
     # 前置钩子
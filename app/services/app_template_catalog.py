@@ -0,0 +1,156 @@
+import asyncio
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config.settings import settings
+from app.models.schema import LCAIMeta
+from app.services import query_app_templates
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
+
+# 名称归一化时去掉的字符（空白、标点）
+_STRIP_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+# 匹配时忽略的泛化词
+_STOP_WORDS = ("应用", "系统", "平台", "工具", "流程", "相关", "管理")
+
+
+def _normalize(text: str) -> str:
+    return _STRIP_PATTERN.sub("", (text or "").lower())
+
+
+def _ngrams(text: str) -> Set[str]:
+    """字符n-gram：单字取unigram，其余取bigram（中文名称检索的常用粒度）"""
+    if len(text) <= 1:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class TemplateIndex:
+    """应用模板名称（templateCname）的字符bigram倒排索引"""
+
+    def __init__(self, templates: List[Dict]):
+        self.templates = templates
+        self.names = [_normalize(t.get("templateCname", "")) for t in templates]
+        self.index: Dict[str, List[int]] = defaultdict(list)
+        for idx, name in enumerate(self.names):
+            for gram in _ngrams(name) | set(name):
+                self.index[gram].append(idx)
+
+    def search(self, terms: List[str], min_score: float = 0.5, limit: int = 10) -> List[Dict]:
+        """
+        按检索词匹配模板
+        检索词先去掉泛化词，每个检索词的得分 = 命中的n-gram比例，名称包含检索词时记满分；模板得分取各检索词最高分
+        :param terms: 检索词（应用名称及提取出的关键词）
+        :param min_score: 最低得分
+        :param limit: 返回数量上限
+        :return: 按得分降序的模板列表
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        totals: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            term = _normalize(term)
+            for word in _STOP_WORDS:
+                term = term.replace(word, "")
+            grams = _ngrams(term)
+            if not grams:
+                continue
+            hits: Dict[int, int] = defaultdict(int)
+            for gram in grams:
+                for idx in self.index.get(gram, ()):
+                    hits[idx] += 1
+            for idx, count in hits.items():
+                score = 1.0 if term in self.names[idx] else count / len(grams)
+                scores[idx] = max(scores[idx], score)
+                totals[idx] += score
+        # 最高分相同时，命中检索词更多的模板优先
+        ranked = sorted((idx for idx, score in scores.items() if score >= min_score),
+                        key=lambda idx: (-scores[idx], -totals[idx], idx))
+        return [self.templates[idx] for idx in ranked[:limit]]
+
+
+class _Snapshot:
+    """某个用户在某个origin下可见的模板目录快照"""
+
+    def __init__(self, templates: List[Dict]):
+        self.index = TemplateIndex(templates)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class AppTemplateCatalog:
+    """
+    应用模板目录缓存：按(origin, userId)保存全量模板快照，本地检索
+    模板查询接口按用户返回可见模板，快照不跨用户共享；长期不活跃用户的快照按LRU淘汰
+    快照过期后先返回旧快照，同时在后台刷新；冷启动时返回None，由调用方回退到实时接口
+    """
+
+    def __init__(self, max_size: int = 1024, refresh: float = 600):
+        """
+        :param max_size: 最多保存的快照数（用户数）
+        :param refresh: 快照刷新间隔（秒），超过10倍刷新间隔未刷新的快照直接丢弃
+        """
+        self.refresh = refresh
+        self._snapshots = TTLCache(max_size=max_size, ttl=refresh * 10)
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    @staticmethod
+    def _key(meta: LCAIMeta) -> Tuple[str, str]:
+        return meta.origin, meta.userId
+
+    def _schedule_refresh(self, meta: LCAIMeta):
+        """后台刷新用户的模板目录（同一用户同时只有一个刷新任务）"""
+        key = self._key(meta)
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(meta))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _task: self._refreshing.pop(key, None))
+
+    async def _refresh(self, meta: LCAIMeta):
+        start = time.perf_counter()
+        try:
+            response = await query_app_templates.call_app_template_query(name_clues="", meta=meta)
+            templates = response.get("result") or []
+            self._snapshots.set(self._key(meta), _Snapshot(templates))
+            logger.info(f"应用模板目录刷新完成：{meta.origin} 用户{meta.userId}，模板数：{len(templates)}，"
+                        f"耗时：{(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            logger.error(f"应用模板目录刷新失败：{meta.origin} 用户{meta.userId}，{str(e)}")
+
+    async def search(self, meta: LCAIMeta, app_name: str, keywords: List[str]) -> Optional[List[Dict]]:
+        """
+        从本地目录检索应用模板
+        :param meta: 元数据（origin、userId决定使用哪个目录）
+        :param app_name: 应用名称
+        :param keywords: 提取出的关键词
+        :return: 匹配的模板列表；目录未加载时返回None
+        """
+        snapshot: Optional[_Snapshot] = self._snapshots.get(self._key(meta))
+        if snapshot is None or snapshot.age > self.refresh:
+            self._schedule_refresh(meta)
+        if snapshot is None:
+            return None
+        return snapshot.index.search(
+            [app_name, *keywords],
+            min_score=settings.APP_TEMPLATE_CATALOG_MIN_SCORE,
+            limit=settings.APP_TEMPLATE_CATALOG_LIMIT
+        )
+
+    def invalidate(self, origin: Optional[str] = None):
+        """清除目录快照（不指定origin时清除全部）"""
+        if origin is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.invalidate(lambda key: key[0] == origin)
+
+
+# 全局应用模板目录实例
+app_template_catalog = AppTemplateCatalog(
+    max_size=settings.APP_TEMPLATE_CATALOG_MAX_SIZE,
+    refresh=settings.APP_TEMPLATE_CATALOG_REFRESH
+)
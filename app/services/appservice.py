@@ -1,17 +1,17 @@
 # 查询应用模板
 from typing import Dict
 
-import requests
+import httpx
 import json
 
 from app.models.schema import LCAIMeta
+from app.services.sbe_client import sbe_client
 from app.utils.logger import logger
 from app.utils.exceptions import AppTemplateApiError, AppGenerateError
 
 # 第三方API配置
-GENERATE_APP_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LA_00"
-ACTIVATE_APP_TEMPLATE_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LA_23"
-API_TIMEOUT = 60  # 超时时间（秒）
+GENERATE_APP_SERVICE = "S_BE_LA_00"
+ACTIVATE_APP_TEMPLATE_SERVICE = "S_BE_LA_23"
 
 
 async def generate_app(app_name, meta: Dict) -> Dict:
@@ -33,23 +33,17 @@ async def generate_app(app_name, meta: Dict) -> Dict:
             "isAiCreateApp": True
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=GENERATE_APP_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, GENERATE_APP_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LA_00调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(f"创建应用API：S_BE_LA_00 执行成功，生成新应用：{response_data.get("appName")}({response_data.get("appId")})")
 
         return {"app_name": response_data.get("appName"), "app_id": response_data.get("appId")}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise AppGenerateError("创建应用API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise AppGenerateError("创建应用API连接失败，请检查网络")
     except Exception as e:
         raise AppGenerateError(f"创建应用异常：{str(e)}")
@@ -76,14 +70,8 @@ async def activate_template(app_name:str, app_template:Dict, meta: LCAIMeta) ->
             "isAiCreateApp": True
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=ACTIVATE_APP_TEMPLATE_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, ACTIVATE_APP_TEMPLATE_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LA_23调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(
@@ -91,9 +79,9 @@ async def activate_template(app_name:str, app_template:Dict, meta: LCAIMeta) ->
 
         return {"app_name": app_name, "app_id": response_data.get("appId")}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise AppGenerateError("应用模板创建应用API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise AppGenerateError("应用模板创建应用API连接失败，请检查网络")
     except Exception as e:
         raise AppGenerateError(f"应用模板创建应用异常：{str(e)}")
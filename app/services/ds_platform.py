@@ -1,9 +1,89 @@
+import asyncio
+import hashlib
 import httpx
-import json
-from typing import Dict, Any, Optional, AsyncGenerator
+import orjson
+import time
+from collections import deque
+from typing import Dict, Any, Optional, AsyncGenerator, List
 from app.config.settings import settings
 from app.utils.logger import logger
 from app.utils.exceptions import DSPlatformError
+from app.utils.rate_limiter import KeyLimiter
+from app.utils.retry import RetryBudget, backoff_delay
+from app.utils.singleflight import SingleFlight
+from app.utils.metrics import (metrics, track_llm, track_upstream, LLM_DURATION, LLM_ERRORS, LLM_IN_FLIGHT,
+                               LLM_CANCELLED, LLM_TOKENS, LLM_QUEUE_WAITING, LLM_QUEUE_REJECTED)
+from app.utils.timing import record_stage, stage
+from app.services.llm_cache import llm_cache, LLMResponseCache
+
+
+class SSEStreamDecoder:
+    """
+    DS平台SSE流增量解码器
+    按字节缓存跨chunk的不完整行，仅在拿到完整的data行后解析一次JSON，避免截断行被丢弃
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        写入一段原始字节，返回其中完整行解析出的增量content
+        :param chunk: 网络读取到的原始字节
+        :return: 增量content列表（可能为空）
+        """
+        buffer = self._buffer
+        buffer += chunk
+        contents = []
+        start = 0
+        # memoryview切片不复制数据，释放后才能裁剪缓冲区
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(b"\n", start)
+                if end < 0:
+                    break
+                self._decode_line(view[start:end], contents)
+                start = end + 1
+        if start:
+            del buffer[:start]
+        return contents
+
+    def flush(self) -> List[str]:
+        """流结束时处理缓冲区中没有换行结尾的最后一行"""
+        contents = []
+        if self._buffer:
+            with memoryview(self._buffer) as view:
+                self._decode_line(view, contents)
+            self._buffer.clear()
+        return contents
+
+    @staticmethod
+    def _decode_line(line: memoryview, contents: List[str]):
+        """解析单行SSE数据，提取增量content"""
+        size = len(line)
+        if size and line[size - 1] == 0x0D:  # 兼容\r\n换行
+            size -= 1
+        if size < 5 or line[:5] != b"data:":
+            return
+        begin = 5
+        while begin < size and line[begin] == 0x20:
+            begin += 1
+        payload = line[begin:size]
+        if payload == b"[DONE]":
+            return
+        try:
+            data = orjson.loads(payload)
+            choices = data.get("choices") or [{}]
+            # 提取增量content（兼容content为null的情况）
+            delta_content = (choices[0].get("delta") or {}).get("content")
+        except orjson.JSONDecodeError as e:
+            logger.error(f"JSON解析失败：{e}，原始行：{bytes(payload[:200]).decode('utf-8', 'replace')}")
+            return
+        except Exception as e:
+            logger.error(f"解析流式数据行失败：{e}")
+            return
+        if delta_content:
+            contents.append(delta_content)
 
 
 class DSPlatformClient:
@@ -13,33 +93,102 @@ class DSPlatformClient:
         self.base_url = settings.DS_BASE_URL
         self.timeout = 120  # 流式超时延长
         self.client = httpx.AsyncClient(timeout=self.timeout)
+        # 最近的首token耗时（秒），供监控排查使用
+        self.ttft_samples = deque(maxlen=1000)
+        # 低温度非流式调用的响应缓存
+        self.cache = llm_cache if settings.LLM_CACHE_ENABLED else None
+        # 相同非流式请求的并发合并
+        self.flight = SingleFlight("ds_llm") if settings.LLM_COALESCE_ENABLED else None
+        # 按API Key的并发/速率限流器
+        self.limiters: Dict[str, KeyLimiter] = {}
+        self.limit_overrides = orjson.loads(settings.DS_KEY_LIMITS) if settings.DS_KEY_LIMITS else {}
+        # 重试预算（重试与对冲共用）及各Key近期延迟样本（用于计算对冲等待时间）
+        self.retry_budget = RetryBudget(settings.DS_RETRY_BUDGET_RATIO, settings.DS_RETRY_BUDGET_RESERVE)
+        self.latency_samples: Dict[str, deque] = {}
+        self.hedged = 0
 
-    async def _parse_stream_chunk(self, chunk: str) -> AsyncGenerator[str, None]:
-        """解析DS平台流式chunk，仅返回增量content"""
-        try:
-            # 按换行符分割chunk，处理多行情况
-            lines = chunk.strip().split("\n")
-            for line in lines:
-                line = line.strip()
-                if not line or not line.startswith("data:"):
-                    continue
+    @staticmethod
+    def _api_key_name(api_key: str) -> str:
+        """API Key对应的配置名（如INTENT、QA），用于限流配置与日志，避免输出密钥"""
+        for name in ("INTENT", "QA", "FORM_BUILD", "FORM_MODIFY", "GENERAL_USE"):
+            if api_key and api_key == getattr(settings, f"DS_API_KEY_{name}"):
+                return name
+        return "key_" + hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
 
-                # 提取JSON部分
-                json_str = line.lstrip("data:").strip()
-                if json_str == "[DONE]":
-                    continue
+    @staticmethod
+    def _estimate_tokens(prompt: str) -> int:
+        """预估提示词token数（中文约一字一token），调用结束后按usage修正"""
+        return len(prompt)
+
+    def _get_limiter(self, api_key: str) -> KeyLimiter:
+        limiter = self.limiters.get(api_key)
+        if limiter is None:
+            name = self._api_key_name(api_key)
+            conf = self.limit_overrides.get(name, {})
+            limiter = KeyLimiter(
+                name=name,
+                max_concurrency=conf.get("concurrency", settings.DS_KEY_MAX_CONCURRENCY),
+                rpm=conf.get("rpm", settings.DS_KEY_RPM),
+                tpm=conf.get("tpm", settings.DS_KEY_TPM),
+                queue_timeout=conf.get("queue_timeout", settings.DS_KEY_QUEUE_TIMEOUT)
+            )
+            self.limiters[api_key] = limiter
+        return limiter
 
-                # 解析单个JSON片段（此时是单行，无多段问题）
-                data = json.loads(json_str)
-                # 提取增量content（兼容content为null的情况）
-                delta_content = data.get("choices", [{}])[0].get("delta", {}).get("content")
-                if delta_content is not None and delta_content != "":
-                    yield delta_content
+    async def _acquire(self, limiter: KeyLimiter, estimated_tokens: int, chatId: str):
+        """排队获取DS平台调用许可，超时转为429错误"""
+        try:
+            wait = await limiter.acquire(estimated_tokens)
+        except asyncio.TimeoutError:
+            logger.error(f"DS平台请求排队超时：key={limiter.name}，chatId={chatId}")
+            raise DSPlatformError(f"DS平台请求排队超时（{limiter.name}），请稍后重试", 429)
+        record_stage("queue:ds", wait)
+        if wait > 0.1:
+            logger.info(f"DS平台请求排队{wait * 1000:.0f}ms：key={limiter.name}，chatId={chatId}")
 
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析失败：{e}，原始行：{line[:200]}")
-        except Exception as e:
-            logger.error(f"解析流式chunk失败：{e}")
+    def _record_ttft(self, chatId: str, stream: bool, ttft: float):
+        """记录首token耗时：流式为首个增量内容到达时间，非流式为完整响应到达时间"""
+        self.ttft_samples.append(ttft)
+        logger.info(f"DS平台首token耗时：{ttft * 1000:.0f}ms，stream={stream}，chatId={chatId}")
+
+    async def _stream_content(self, response: httpx.Response, chatId: str, start: float,
+                              limiter: KeyLimiter, estimated_tokens: int) -> AsyncGenerator[str, None]:
+        """
+        逐段读取流式响应并返回增量content
+        调用方提前停止迭代（break/aclose）或被取消（客户端断开）时，在finally中释放连接及限流许可
+        """
+        first_token = True
+        decoder = SSEStreamDecoder()
+        failed = False
+        cancelled = False
+        try:
+            async for raw_chunk in response.aiter_bytes():
+                contents = decoder.feed(raw_chunk)
+                if contents and first_token:
+                    first_token = False
+                    self._record_ttft(chatId, True, time.perf_counter() - start)
+                for content in contents:
+                    yield content  # 仅返回有效增量内容
+            for content in decoder.flush():
+                yield content
+        except httpx.HTTPError as e:
+            failed = True
+            logger.error(f"DS平台流式读取异常：{str(e)}", exc_info=True)
+            raise DSPlatformError(f"DS平台流式读取异常：{str(e)}")
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            await response.aclose()
+            limiter.release(estimated_tokens)
+            if failed:
+                LLM_ERRORS.inc(agent=limiter.name, stream="true")
+            if cancelled:
+                LLM_CANCELLED.inc(agent=limiter.name, stream="true")
+            LLM_DURATION.observe(time.perf_counter() - start, agent=limiter.name, stream="true")
+            LLM_IN_FLIGHT.dec(agent=limiter.name, stream="true")
+            record_stage("ds:stream", time.perf_counter() - start, start)
+            logger.info(f"DS平台流式响应结束，总耗时：{(time.perf_counter() - start) * 1000:.0f}ms，chatId={chatId}")
 
     async def call_llm(
             self,
@@ -47,16 +196,28 @@ class DSPlatformClient:
             chatId: str,
             prompt: str,
             stream: bool = False,
-            temperature: float = 0.1
+            temperature: float = 0.1,
+            use_cache: bool = True,
+            hedge: bool = False
     ) -> Dict[str, Any]:
         """
         调用宝武DS平台LLM接口
         :param api_key: 智能体API密钥
         :param prompt: 提示词
-        :param stream: 是否流式响应
+        :param stream: 是否流式响应（基于httpx流式请求，收到首个chunk即返回内容）
         :param temperature: 生成温度
+        :param use_cache: 是否使用响应缓存（仅对非流式、温度不高于LLM_CACHE_MAX_TEMPERATURE的调用生效）
+        :param hedge: 是否启用对冲请求（仅适用于短小、幂等的非流式调用）
         :return: LLM响应结果
         """
+        cache_key = None
+        if use_cache and self.cache is not None and self.cache.cacheable(stream, temperature):
+            cache_key = self.cache.make_key(api_key, settings.DS_MODEL_NAME, prompt, temperature)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"DS平台响应命中缓存：{cached['content'][:50]}...")
+                return {**cached, "ttft": 0.0, "cached": True}
+
         headers = {
             # "Content-Type": "application/json",
             "Accept": "application/json",
@@ -71,42 +232,197 @@ class DSPlatformClient:
             "chatId": chatId
         }
 
+        # 非流式调用：相同请求并发时合并为一次上游调用，共享同一结果
+        if not stream:
+            with track_llm(self._api_key_name(api_key), "false"):
+                if self.flight is None:
+                    return await self._complete(api_key, headers, payload, chatId, cache_key, hedge)
+                flight_key = cache_key or LLMResponseCache.make_key(api_key, settings.DS_MODEL_NAME, prompt,
+                                                                    temperature)
+                result = await self.flight.do(flight_key, self._complete, api_key, headers, payload, chatId,
+                                              cache_key, hedge)
+                return dict(result)
+
+        # logger.info(f"调用DS平台LLM：model={settings.DS_MODEL_NAME}, stream={stream}")
+        limiter = self._get_limiter(api_key)
+        estimated_tokens = self._estimate_tokens(prompt)
+        await self._acquire(limiter, estimated_tokens, chatId)
+        start = time.perf_counter()
+        # 流式调用的耗时与进行中数量在读取结束时（_stream_content）记录
+        LLM_IN_FLIGHT.inc(agent=limiter.name, stream="true")
         try:
-            # logger.info(f"调用DS平台LLM：model={settings.DS_MODEL_NAME}, stream={stream}")
-            response = await self.client.post(
-                url=self.base_url + "/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-
-            if stream:
-                # 流式响应返回生成器（处理多行chunk）
-                async def stream_generator() -> AsyncGenerator[str, None]:
-                    async for raw_chunk in response.aiter_text():
-                        # 调用修复后的解析方法，逐段返回content
-                        async for content in self._parse_stream_chunk(raw_chunk):
-                            # print(f"DS流式返回:{content}")
-                            yield content  # 仅返回有效增量内容
-                return {"stream": stream_generator()}
+            # 尚未向调用方返回任何内容，建立连接阶段的瞬时错误可以安全重试
+            response = await self._with_retry(self._open_stream, headers, payload)
+        except BaseException as e:
+            limiter.release(estimated_tokens)
+            if isinstance(e, asyncio.CancelledError):
+                LLM_CANCELLED.inc(agent=limiter.name, stream="true")
             else:
-                result = response.json()
-                logger.info(f"DS平台响应：{result.get('choices')[0].get('message').get('content')[:50]}...")
-                return {
-                    "content": result.get("choices")[0].get("message").get("content"),
-                    "usage": result.get("usage", {})
-                }
-        except httpx.HTTPStatusError as e:
-            logger.error(f"DS平台HTTP错误：{e.response.status_code} - {e.response.text}")
-            raise DSPlatformError(f"DS平台调用失败：{e.response.text}", e.response.status_code)
-        except Exception as e:
-            logger.error(f"DS平台调用异常：{str(e)}", exc_info=True)
-            raise DSPlatformError(f"DS平台调用异常：{str(e)}")
+                LLM_ERRORS.inc(agent=limiter.name, stream="true")
+            LLM_DURATION.observe(time.perf_counter() - start, agent=limiter.name, stream="true")
+            LLM_IN_FLIGHT.dec(agent=limiter.name, stream="true")
+            raise
+        return {"stream": self._stream_content(response, chatId, start, limiter, estimated_tokens)}
+
+    async def _open_stream(self, headers: Dict[str, str], payload: Dict[str, Any]) -> httpx.Response:
+        """发起流式请求：仅读取响应头，响应体交由生成器逐段读取"""
+        request = self.client.build_request(
+            "POST",
+            url=self.base_url + "/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        with track_upstream("ds", "chat/completions"), stage("ds:chat/completions"):
+            response = await self.client.send(request, stream=True)
+        if response.is_error:
+            # 错误响应需读完响应体才能拿到错误信息，随后释放连接
+            await response.aread()
+            await response.aclose()
+        response.raise_for_status()
+        return response
+
+    async def _complete(self, api_key: str, headers: Dict[str, str], payload: Dict[str, Any], chatId: str,
+                        cache_key: Optional[str], hedge: bool = False) -> Dict[str, Any]:
+        """发起非流式请求（瞬时错误按预算重试，可选对冲），成功后写入缓存"""
+        if hedge and settings.DS_HEDGE_ENABLED:
+            result = await self._with_retry(self._post_hedged, api_key, headers, payload, chatId)
+        else:
+            result = await self._with_retry(self._post_once, api_key, headers, payload, chatId)
+        if cache_key is not None and result["content"]:
+            await self.cache.set(cache_key, {"content": result["content"], "usage": result["usage"]})
+        return result
+
+    async def _post_once(self, api_key: str, headers: Dict[str, str], payload: Dict[str, Any],
+                         chatId: str) -> Dict[str, Any]:
+        """单次非流式请求（经过限流排队）"""
+        limiter = self._get_limiter(api_key)
+        estimated_tokens = self._estimate_tokens(payload["messages"][0]["content"])
+        await self._acquire(limiter, estimated_tokens, chatId)
+        actual_tokens = None
+        start = time.perf_counter()
+        try:
+            with track_upstream("ds", "chat/completions"), stage("ds:chat/completions"):
+                response = await self.client.post(
+                    url=self.base_url + "/chat/completions",
+                    headers=headers,
+                    json=payload
+                )
+                response.raise_for_status()
+            ttft = time.perf_counter() - start
+            self._record_ttft(chatId, False, ttft)
+            self.latency_samples.setdefault(limiter.name, deque(maxlen=200)).append(ttft)
+            result = response.json()
+            logger.info(f"DS平台响应：{result.get('choices')[0].get('message').get('content')[:50]}...")
+            usage = result.get("usage", {})
+            actual_tokens = usage.get("total_tokens")
+            for token_type in ("prompt_tokens", "completion_tokens"):
+                if usage.get(token_type):
+                    LLM_TOKENS.inc(usage[token_type], agent=limiter.name, type=token_type.split("_")[0])
+            return {
+                "content": result.get("choices")[0].get("message").get("content"),
+                "usage": usage,
+                "ttft": ttft
+            }
+        finally:
+            limiter.release(estimated_tokens, actual_tokens)
+
+    def _hedge_delay(self, api_key: str) -> float:
+        """对冲等待时间：取该Key近期延迟的指定分位数，样本不足时使用默认值"""
+        samples = self.latency_samples.get(self._api_key_name(api_key))
+        if not samples or len(samples) < settings.DS_HEDGE_MIN_SAMPLES:
+            return settings.DS_HEDGE_DEFAULT_DELAY
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * settings.DS_HEDGE_PERCENTILE / 100))
+        return ordered[index]
+
+    async def _post_hedged(self, api_key: str, headers: Dict[str, str], payload: Dict[str, Any],
+                           chatId: str) -> Dict[str, Any]:
+        """
+        对冲请求：首个请求超过分位数延迟仍未返回时再发一个相同请求，取先成功者，取消另一个
+        对冲请求与重试共用重试预算
+        """
+        delay = self._hedge_delay(api_key)
+        tasks = {asyncio.ensure_future(self._post_once(api_key, headers, payload, chatId))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.retry_budget.withdraw():
+                self.hedged += 1
+                logger.info(f"DS平台请求超过{delay * 1000:.0f}ms未返回，发起对冲请求：chatId={chatId}")
+                tasks.add(asyncio.ensure_future(self._post_once(api_key, headers, payload, chatId)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _is_transient(e: Exception) -> bool:
+        """可重试的瞬时错误：5xx及连接/超时类错误"""
+        if isinstance(e, httpx.HTTPStatusError):
+            return e.response.status_code >= 500
+        return isinstance(e, httpx.TransportError)
+
+    async def _with_retry(self, fn, *args):
+        """按指数退避+抖动重试瞬时错误，重试次数受DS_RETRY_MAX与重试预算双重约束"""
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await fn(*args)
+            except DSPlatformError:
+                raise
+            except Exception as e:
+                if attempt < settings.DS_RETRY_MAX and self._is_transient(e) and self.retry_budget.withdraw():
+                    attempt += 1
+                    delay = backoff_delay(attempt, settings.DS_RETRY_BASE_DELAY, settings.DS_RETRY_MAX_DELAY)
+                    logger.warning(f"DS平台调用瞬时错误：{str(e)}，{delay:.2f}s后第{attempt}次重试")
+                    await asyncio.sleep(delay)
+                    continue
+                if isinstance(e, httpx.HTTPStatusError):
+                    logger.error(f"DS平台HTTP错误：{e.response.status_code} - {e.response.text}")
+                    raise DSPlatformError(f"DS平台调用失败：{e.response.text}", e.response.status_code)
+                logger.error(f"DS平台调用异常：{str(e)}", exc_info=True)
+                raise DSPlatformError(f"DS平台调用异常：{str(e)}")
+
+    def retry_stats(self) -> Dict[str, float]:
+        """重试预算与对冲统计"""
+        return {
+            "budget_balance": self.retry_budget.balance,
+            "retries_and_hedges": self.retry_budget.withdrawn,
+            "budget_exhausted": self.retry_budget.exhausted,
+            "hedged": self.hedged,
+        }
+
+    def limiter_stats(self) -> Dict[str, Dict[str, float]]:
+        """各API Key的排队与并发指标"""
+        return {limiter.name: limiter.stats() for limiter in self.limiters.values()}
+
+    def cache_stats(self) -> Dict[str, int]:
+        """响应缓存命中统计"""
+        return self.cache.stats() if self.cache is not None else {}
 
     async def close(self):
         """关闭HTTP客户端"""
         await self.client.aclose()
+        if self.cache is not None:
+            self.cache.close()
 
 
 # 全局DS平台客户端实例
-ds_client = DSPlatformClient()
\ No newline at end of file
+ds_client = DSPlatformClient()
+
+
+def _collect_limiter_metrics():
+    """/metrics输出前读取各API Key的排队指标"""
+    for name, stats in ds_client.limiter_stats().items():
+        LLM_QUEUE_WAITING.set(stats["waiting"], agent=name)
+        LLM_QUEUE_REJECTED.set(stats["rejected"], agent=name)
+
+
+metrics.register_collector(_collect_limiter_metrics)
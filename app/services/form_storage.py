@@ -2,6 +2,8 @@ import httpx
 from typing import Dict, Any
 from app.config.settings import settings
 from app.utils.logger import logger
+from app.utils.metrics import track_upstream
+from app.utils.timing import stage
 from app.utils.exceptions import FormStorageError
 from app.models.schema import FormSchema
 
@@ -30,12 +32,13 @@ class FormStorageClient:
 
         try:
             logger.info(f"调用表单保存API：form_name={form_schema.form_name}")
-            response = await self.client.post(
-                url=self.base_url,
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
+            with track_upstream("form_storage", "save_form"), stage("form_storage:save_form"):
+                response = await self.client.post(
+                    url=self.base_url,
+                    headers=headers,
+                    json=payload
+                )
+                response.raise_for_status()
 
             result = response.json()
             logger.info(f"表单保存成功：form_id={result.get('form_id')}")
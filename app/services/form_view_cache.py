@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional
+
+from app.config.settings import settings
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
+
+
+class FormViewCache:
+    """
+    表单视图缓存（跨会话共享）
+    - 表单视图：key=(origin, appId, modelId, modelVersion)，value为解析后的表单JSON，命中时无需再次请求和解析
+    - 应用内表单列表：key=(origin, userId, workspaceId, appId)，与并发合并的key一致；
+      列表是modelVersion的来源，设计器或其他worker修改表单时本进程无法感知，只缓存很短时间，
+      表单视图按版本缓存，版本变化后自然不再命中
+    表单创建/修改成功后按应用失效；缓存对象为共享只读对象，调用方不要修改
+    """
+
+    def __init__(self, max_size: int, ttl: int, model_list_ttl: int = 10):
+        """
+        :param max_size: 最大条目数
+        :param ttl: 表单视图过期时间（秒）
+        :param model_list_ttl: 应用内表单列表过期时间（秒）
+        """
+        self.views = TTLCache(max_size=max_size, ttl=ttl)
+        self.model_lists = TTLCache(max_size=max_size, ttl=model_list_ttl)
+
+    def get_view(self, origin: str, app_id: str, model_id: str, model_version: str) -> Optional[Dict]:
+        return self.views.get((origin, app_id, model_id, model_version))
+
+    def set_view(self, origin: str, app_id: str, model_id: str, model_version: str, form_json: Dict):
+        self.views.set((origin, app_id, model_id, model_version), form_json)
+
+    def get_model_list(self, origin: str, user_id: str, workspace_id: str, app_id: str) -> Optional[List[Dict]]:
+        return self.model_lists.get((origin, user_id, workspace_id, app_id))
+
+    def set_model_list(self, origin: str, user_id: str, workspace_id: str, app_id: str, model_list: List[Dict]):
+        self.model_lists.set((origin, user_id, workspace_id, app_id), model_list)
+
+    def invalidate_app(self, origin: str, app_id: str):
+        """应用内表单发生变更时，清除该应用的表单列表及全部表单视图"""
+        removed = self.model_lists.invalidate(lambda key: key[0] == origin and key[3] == app_id)
+        removed += self.views.invalidate(lambda key: key[0] == origin and key[1] == app_id)
+        if removed:
+            logger.info(f"表单视图缓存失效：{origin} 应用{app_id}，清除{removed}条")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"views": self.views.stats(), "model_lists": self.model_lists.stats()}
+
+
+# 全局表单视图缓存实例
+form_view_cache = FormViewCache(
+    max_size=settings.FORM_VIEW_CACHE_SIZE,
+    ttl=settings.FORM_VIEW_CACHE_TTL,
+    model_list_ttl=settings.FORM_MODEL_LIST_CACHE_TTL
+)
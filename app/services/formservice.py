@@ -2,18 +2,25 @@
 from typing import Dict, List
 
 import json
-import requests
+import httpx
 
+from app.config.settings import settings
 from app.models.schema import LCAIMeta
+from app.services.form_view_cache import form_view_cache
+from app.services.sbe_client import sbe_client
 from app.utils.logger import logger
 from app.utils.exceptions import AppGenerateError, FormModifyError, FormBuildError
+from app.utils.singleflight import SingleFlight
 
 # 第三方API配置
-GENERATE_FORM_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LV_41"
-MODIFY_FORM_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LM_168"
-QUERY_FORM_IN_APP_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LV_1101"
-QUERY_FORM_VIEW_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LV_10"
-API_TIMEOUT = 60  # 超时时间（秒）
+GENERATE_FORM_SERVICE = "S_BE_LV_41"
+MODIFY_FORM_SERVICE = "S_BE_LM_168"
+QUERY_FORM_IN_APP_SERVICE = "S_BE_LV_1101"
+QUERY_FORM_VIEW_SERVICE = "S_BE_LV_10"
+
+# 只读查询的并发合并
+_query_form_in_app_flight = SingleFlight("S_BE_LV_1101")
+_query_form_view_flight = SingleFlight("S_BE_LV_10")
 
 
 async def generate_form(form_name, form_json, app_id, meta: LCAIMeta) -> Dict:
@@ -40,24 +47,20 @@ async def generate_form(form_name, form_json, app_id, meta: LCAIMeta) -> Dict:
             "addMenu": True
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=GENERATE_FORM_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, GENERATE_FORM_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LV_41调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(
             f"创建表单API：S_BE_LV_41 执行成功，生成新表单：{response_data.get("modelId")}")
 
+        form_view_cache.invalidate_app(meta.origin, app_id)
+
         return {"model_id": response_data.get("modelId")}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise FormBuildError("创建表单API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise FormBuildError("创建表单API连接失败，请检查网络")
     except Exception as e:
         raise FormBuildError(f"创建表单异常：{str(e)}")
@@ -82,34 +85,45 @@ async def modify_form(model_id, form_modify_json, app_id, meta: LCAIMeta) -> Dic
             "fieldsJson": form_modify_json
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=MODIFY_FORM_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, MODIFY_FORM_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LM_168调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(f"修改表单API：S_BE_LM_168 执行成功：{response_data.get("modelId")}")
 
+        form_view_cache.invalidate_app(meta.origin, app_id)
+
         return {"model_id": response_data.get("modelId"), "form_json":response_data.get("updateFormJson")} #TODO
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise FormModifyError("修改表单API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise FormModifyError("修改表单API连接失败，请检查网络")
     except Exception as e:
         raise FormModifyError(f"修改表单异常：{str(e)}")
 
 async def query_form_in_app(app_id:str, meta: LCAIMeta) -> List[Dict]:
     """
-    调用API（S_BE_LV_1101）
+    调用API（S_BE_LV_1101），优先读取表单视图缓存（短时缓存，保证modelVersion及时更新），相同查询的并发请求只调用一次
     :param app_id: 应用id
     :param meta: 元数据（包含userId、origin等环境信息）
-    :return: API响应结果 list<map>
+    :return: API响应结果 list<map>（缓存及并发调用方共享，只读）
     """
+    key = (meta.origin, meta.userId, meta.cur_workspaceId, app_id)
+    model_list = form_view_cache.get_model_list(*key)
+    if model_list is not None:
+        return model_list
+    if not settings.S_BE_COALESCE_ENABLED:
+        model_list = await _query_form_in_app(app_id, meta)
+    else:
+        model_list = await _query_form_in_app_flight.do(key, _query_form_in_app, app_id, meta)
+    if model_list is not None:
+        form_view_cache.set_model_list(*key, model_list)
+    return model_list
+
+
+async def _query_form_in_app(app_id:str, meta: LCAIMeta) -> List[Dict]:
+    """调用API（S_BE_LV_1101）"""
     try:
         # 构造POST请求参数
         request_body = {
@@ -120,14 +134,8 @@ async def query_form_in_app(app_id:str, meta: LCAIMeta) -> List[Dict]:
             "limit": 5
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=QUERY_FORM_IN_APP_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, QUERY_FORM_IN_APP_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LV_1101调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(
@@ -135,9 +143,9 @@ async def query_form_in_app(app_id:str, meta: LCAIMeta) -> List[Dict]:
 
         return response_data.get("modelList")
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise FormBuildError("查询应用内表单API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise FormBuildError("查询应用内表单API连接失败，请检查网络")
     except Exception as e:
         raise FormBuildError(f"查询应用内表单异常：{str(e)}")
@@ -145,11 +153,27 @@ async def query_form_in_app(app_id:str, meta: LCAIMeta) -> List[Dict]:
 
 async def query_form_view(app_id:str, model_id:str, model_version:str, meta: LCAIMeta) -> Dict:
     """
-    调用API（S_BE_LV_10）
+    调用API（S_BE_LV_10），优先读取表单视图缓存（已解析的表单JSON），相同查询的并发请求只调用一次
     :param app_id: 应用id
     :param meta: 元数据（包含userId、origin等环境信息）
-    :return: API响应结果 list<map>
+    :return: 表单JSON（缓存及并发调用方共享，只读）
     """
+    form_json = form_view_cache.get_view(meta.origin, app_id, model_id, model_version)
+    if form_json is not None:
+        logger.info(f"表单视图缓存命中：{model_id}({model_version})")
+        return form_json
+    if not settings.S_BE_COALESCE_ENABLED:
+        form_json = await _query_form_view(app_id, model_id, model_version, meta)
+    else:
+        key = (meta.origin, meta.userId, meta.cur_workspaceId, app_id, model_id, model_version)
+        form_json = await _query_form_view_flight.do(key, _query_form_view, app_id, model_id, model_version, meta)
+    if form_json:
+        form_view_cache.set_view(meta.origin, app_id, model_id, model_version, form_json)
+    return form_json
+
+
+async def _query_form_view(app_id:str, model_id:str, model_version:str, meta: LCAIMeta) -> Dict:
+    """调用API（S_BE_LV_10）"""
     try:
         # 构造POST请求参数
         request_body = {
@@ -162,14 +186,8 @@ async def query_form_view(app_id:str, model_id:str, model_version:str, meta: LCA
             "querySysFields": True
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=QUERY_FORM_VIEW_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, QUERY_FORM_VIEW_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppGenerateError(f"S_BE_LV_10调用失败：{response_data.get("__sys__").get("msg")}")
 
@@ -188,9 +206,9 @@ async def query_form_view(app_id:str, model_id:str, model_version:str, meta: LCA
                     raise ValueError(f"表单JSON解析失败：{str(e)}")
         return {}
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise FormBuildError("查询应用内表单API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise FormBuildError("查询应用内表单API连接失败，请检查网络")
     except Exception as e:
         raise FormBuildError(f"查询应用内表单异常：{str(e)}")
\ No newline at end of file
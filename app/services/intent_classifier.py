@@ -0,0 +1,213 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from app.config.settings import settings
+from app.utils.logger import logger
+
+# 内置标注样本（input, intent）
+INTENT_SAMPLES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "intent_samples.jsonl")
+# 本地分类器支持的意图（其余意图仍交给LLM判断）
+LOCAL_INTENTS = ("qa", "app_build", "form_modify", "complex")
+# complex与app_build措辞高度重叠，只由关键词规则判定，不参与朴素贝叶斯训练
+RULE_ONLY_INTENTS = ("complex",)
+
+# 名称归一化时去掉的字符（空白、标点）
+_STRIP_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def _normalize(text: str) -> str:
+    return _STRIP_PATTERN.sub("", (text or "").lower())
+
+
+def char_ngrams(text: str, min_n: int = 1, max_n: int = 3) -> List[str]:
+    """字符n-gram特征（默认1~3字）"""
+    grams = []
+    for n in range(min_n, max_n + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+# 创建类动词（多表单规则要求明确的创建表述，排除问答、修改表单）
+_CREATE_WORDS = ("创建", "新建", "搭建", "建立", "建一个", "做一个", "生成")
+# 表单名称之间的分隔词
+_FORM_SEPARATOR = re.compile(r"[、和及与,，]")
+
+
+def match_rules(text: str) -> Optional[str]:
+    """关键词规则：明确包含多任务表述时直接判定为complex（强制通过规划智能体）"""
+    if "两个" in text or "然后" in text or ("先" in text and "后" in text):
+        return "complex"
+    return None
+
+
+def match_multi_form(text: str) -> bool:
+    """
+    多表单创建规则：包含创建类动词，且应用之后列出两个及以上表单名称
+    （如"建人事应用，里面有员工信息表单和请假表单"、"包含项目信息、任务分配、进度汇报表单"）
+    """
+    if not any(word in text for word in _CREATE_WORDS) or "表单" not in text:
+        return False
+    segment = text[text.rfind("应用") + 2:] if "应用" in text else text
+    if segment.count("表单") >= 2:
+        return True
+    names = [name for name in _FORM_SEPARATOR.split(segment[:segment.rfind("表单")]) if len(name) >= 2]
+    return len(names) >= 2
+
+
+class IntentClassifier:
+    """
+    本地意图分类器：关键词规则 + 字符n-gram朴素贝叶斯
+    规则命中时置信度为rule_confidence（默认低于本地判定阈值，仍交给LLM判断，只避免朴素贝叶斯把多任务需求
+    高置信度地判为app_build），否则置信度取朴素贝叶斯后验概率；输入特征覆盖率过低时置信度为0
+    首次使用时才加载样本训练，避免导入时开销
+    """
+
+    def __init__(self, sample_path: str, log_path: str = "", alpha: float = 0.5, min_coverage: float = 0.3,
+                 rule_confidence: float = 0.9):
+        """
+        :param sample_path: 标注样本文件（JSONL，每行{"input": ..., "intent": ...}）
+        :param log_path: LLM判定结果的样本日志（同格式，为空则不记录），重新训练时一并加载
+        :param alpha: 拉普拉斯平滑系数
+        :param min_coverage: 输入2字n-gram在训练样本中出现的最低比例，低于该比例不做本地判定
+        :param rule_confidence: 关键词规则命中时的置信度
+        """
+        self.sample_paths = [path for path in (sample_path, log_path) if path]
+        self.log_path = log_path
+        self.alpha = alpha
+        self.min_coverage = min_coverage
+        self.rule_confidence = rule_confidence
+        self.trained = False
+        self.class_counts: Counter = Counter()
+        self.gram_counts: Dict[str, Counter] = {}
+        self.gram_totals: Dict[str, int] = {}
+        self.vocab: set = set()
+
+    @staticmethod
+    def load_samples(path: str) -> List[Tuple[str, str]]:
+        """读取标注样本，跳过非本地意图及格式错误的行"""
+        samples = []
+        if not os.path.exists(path):
+            return samples
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    item = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                if item.get("intent") in LOCAL_INTENTS and item.get("input"):
+                    samples.append((item["input"], item["intent"]))
+        return samples
+
+    def train(self, samples: Iterable[Tuple[str, str]]):
+        """使用（输入, 意图）样本训练"""
+        self.class_counts = Counter()
+        self.gram_counts = defaultdict(Counter)
+        for text, intent in samples:
+            if intent in RULE_ONLY_INTENTS:
+                continue
+            self.class_counts[intent] += 1
+            self.gram_counts[intent].update(char_ngrams(_normalize(text)))
+        self.gram_totals = {intent: sum(counts.values()) for intent, counts in self.gram_counts.items()}
+        self.vocab = set().union(*self.gram_counts.values()) if self.gram_counts else set()
+        self.trained = True
+
+    def reload(self):
+        """重新加载所有样本文件并训练（如样本日志积累后）"""
+        samples = []
+        for path in self.sample_paths:
+            samples.extend(self.load_samples(path))
+        start = time.perf_counter()
+        self.train(samples)
+        logger.info(f"本地意图分类器训练完成：样本数：{len(samples)}，特征数：{len(self.vocab)}，"
+                    f"耗时：{(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        预测意图
+        :param text: 用户输入
+        :return: (意图, 置信度)，无法判断时返回("unknown", 0.0)
+        """
+        if match_rules(text) or match_multi_form(text):
+            return "complex", self.rule_confidence
+        if not self.trained:
+            self.reload()
+        grams = char_ngrams(_normalize(text))
+        if not grams or not self.class_counts:
+            return "unknown", 0.0
+
+        total_samples = sum(self.class_counts.values())
+        vocab_size = len(self.vocab) + 1
+        log_probs = {}
+        for intent, class_count in self.class_counts.items():
+            counts = self.gram_counts[intent]
+            denominator = math.log(self.gram_totals[intent] + self.alpha * vocab_size)
+            log_prob = math.log(class_count / total_samples)
+            for gram in grams:
+                log_prob += math.log(counts.get(gram, 0) + self.alpha) - denominator
+            log_probs[intent] = log_prob
+
+        best_intent = max(log_probs, key=log_probs.get)
+        best = log_probs[best_intent]
+        posterior = 1.0 / sum(math.exp(value - best) for value in log_probs.values())
+        # 输入的2字n-gram多数未在训练样本中出现时（领域外表述），后验不可信，交给LLM
+        bigrams = [gram for gram in grams if len(gram) == 2]
+        if not bigrams or sum(1 for gram in bigrams if gram in self.vocab) / len(bigrams) < self.min_coverage:
+            return best_intent, 0.0
+        return best_intent, posterior
+
+    async def record(self, text: str, intent: str):
+        """记录LLM判定的（输入, 意图）样本，用于后续重新训练"""
+        if not self.log_path or intent not in LOCAL_INTENTS:
+            return
+        line = orjson.dumps({"input": text, "intent": intent}) + b"\n"
+
+        def _append():
+            with open(self.log_path, "ab") as f:
+                f.write(line)
+
+        try:
+            await asyncio.to_thread(_append)
+        except OSError as e:
+            logger.warning(f"意图样本记录失败：{str(e)}")
+
+    def evaluate(self, samples: List[Tuple[str, str]], threshold: float) -> Dict[str, float]:
+        """
+        评估分类器（精度/覆盖率/延迟）
+        :param samples: 标注样本（不应与训练样本重叠）
+        :param threshold: 置信度阈值，达到阈值的输入本地判定，其余交给LLM
+        :return: 评估报告
+        """
+        accepted = correct = 0
+        latencies = []
+        for text, intent in samples:
+            start = time.perf_counter()
+            predicted, confidence = self.predict(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if confidence >= threshold:
+                accepted += 1
+                correct += predicted == intent
+        latencies.sort()
+        total = len(samples) or 1
+        return {
+            "samples": len(samples),
+            "coverage": accepted / total,
+            "precision": correct / accepted if accepted else 0.0,
+            "latency_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0,
+        }
+
+
+# 全局本地意图分类器实例
+intent_classifier = IntentClassifier(
+    sample_path=INTENT_SAMPLES_PATH,
+    log_path=settings.INTENT_SAMPLE_LOG_PATH,
+    min_coverage=settings.INTENT_LOCAL_MIN_COVERAGE,
+    rule_confidence=settings.INTENT_LOCAL_RULE_CONFIDENCE
+)
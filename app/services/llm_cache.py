@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import orjson
+
+from app.config.settings import settings
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
+
+
+class LLMResponseCache:
+    """
+    LLM响应精确匹配缓存
+    key = (api_key, model, 归一化后的prompt, temperature)，内存层LRU+TTL，可选SQLite磁盘层
+    磁盘层在线程池中读写，共用一个连接，连接创建及每次读写均在锁内执行；过期数据按间隔清理，不在每次写入时全表删除
+    """
+
+    def __init__(self, max_size: int, ttl: int, max_temperature: float, disk_path: str = "",
+                 purge_interval: float = 300):
+        """
+        :param max_size: 内存层最大条目数
+        :param ttl: 缓存过期时间（秒）
+        :param max_temperature: 可缓存的最高温度
+        :param disk_path: SQLite磁盘缓存路径（为空则不启用）
+        :param purge_interval: 磁盘层过期数据清理间隔（秒）
+        """
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+        self.disk_path = disk_path
+        self.disk_hits = 0
+        self.purge_interval = purge_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """归一化提示词：合并连续空白，避免模板缩进差异导致缓存不命中"""
+        return " ".join(prompt.split())
+
+    @classmethod
+    def make_key(cls, api_key: str, model: str, prompt: str, temperature: float) -> str:
+        raw = "\x1f".join([api_key or "", model or "", cls.normalize_prompt(prompt), f"{temperature:.3f}"])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cacheable(self, stream: bool, temperature: float) -> bool:
+        """仅缓存非流式、温度不高于阈值的调用"""
+        return not stream and temperature <= self.max_temperature
+
+    def _get_db(self) -> sqlite3.Connection:
+        """获取连接（调用方持有锁）"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value BLOB, expire_at REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._get_db().execute(
+                "SELECT value, expire_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return orjson.loads(row[0])
+
+    def _disk_set(self, key: str, value: Dict[str, Any]):
+        data = orjson.dumps(value)
+        with self._lock:
+            db = self._get_db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expire_at) VALUES (?, ?, ?)",
+                (key, data, time.time() + self.ttl)
+            )
+            db.commit()
+        self._maybe_purge()
+
+    def purge(self) -> int:
+        """
+        清理磁盘层过期数据
+        :return: 删除条数
+        """
+        with self._lock:
+            db = self._get_db()
+            deleted = db.execute("DELETE FROM llm_cache WHERE expire_at < ?", (time.time(),)).rowcount
+            db.commit()
+            self._last_purge = time.monotonic()
+        return deleted
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self.purge()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存：先查内存，再查磁盘（命中后回填内存）"""
+        value = self.memory.get(key)
+        if value is not None or not self.disk_path:
+            return value
+        try:
+            value = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logger.warning(f"LLM磁盘缓存读取失败：{str(e)}")
+            return None
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        self.memory.set(key, value)
+        if self.disk_path:
+            try:
+                await asyncio.to_thread(self._disk_set, key, value)
+            except Exception as e:
+                logger.warning(f"LLM磁盘缓存写入失败：{str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计（hits包含磁盘命中）"""
+        stats = self.memory.stats()
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# 全局LLM响应缓存实例
+llm_cache = LLMResponseCache(
+    max_size=settings.LLM_CACHE_MAX_SIZE,
+    ttl=settings.LLM_CACHE_TTL,
+    max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,
+    disk_path=settings.LLM_CACHE_DISK_PATH,
+    purge_interval=settings.LLM_CACHE_PURGE_INTERVAL
+)
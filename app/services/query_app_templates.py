@@ -1,23 +1,36 @@
 # 查询应用模板
 from typing import Dict
 
-import requests
+import httpx
 import json
+from app.config.settings import settings
+from app.services.sbe_client import sbe_client
 from app.utils.logger import logger
 from app.utils.exceptions import AppTemplateApiError
+from app.utils.singleflight import SingleFlight
 
 # 第三方API配置
-APP_TEMPLATE_API_URL = "https://eplatdev.baocloud.cn/code-admin/service/S_BE_LA_18"
-API_TIMEOUT = 60  # 超时时间（秒）
+APP_TEMPLATE_SERVICE = "S_BE_LA_18"
+
+# 相同查询并发合并
+_template_query_flight = SingleFlight("S_BE_LA_18")
 
 
 async def call_app_template_query(name_clues, meta: Dict) -> Dict:
     """
-    调用应用模板查询API（S_BE_LA_18）
+    调用应用模板查询API（S_BE_LA_18），相同环境、用户、查询条件的并发请求只调用一次
     :param user_input: 用户表单搭建需求（如“设备报修表单”）
     :param meta: 元数据（包含userId、origin等环境信息）
-    :return: API响应结果
+    :return: API响应结果（并发调用方共享，只读）
     """
+    if not settings.S_BE_COALESCE_ENABLED:
+        return await _call_app_template_query(name_clues, meta)
+    key = (meta.origin, meta.userId, name_clues)
+    return await _template_query_flight.do(key, _call_app_template_query, name_clues, meta)
+
+
+async def _call_app_template_query(name_clues, meta: Dict) -> Dict:
+    """调用应用模板查询API（S_BE_LA_18）"""
     try:
         # 构造POST请求参数（根据第三方API要求调整，这里假设需要userInput和meta信息）
         request_body = {
@@ -28,24 +41,16 @@ async def call_app_template_query(name_clues, meta: Dict) -> Dict:
             "returnLowcodeConfig": False,
         }
 
-        # 发送POST请求（同步请求，若需异步可改用aiohttp）
-        response = requests.post(
-            url=APP_TEMPLATE_API_URL.replace("https://eplatdev.baocloud.cn", meta.origin),
-            json=request_body,
-            timeout=API_TIMEOUT,
-            headers={"Content-Type": "application/json"}
-        )
-
-        # 解析响应（假设API返回格式：{"code":0,"msg":"success","result":[]}）
-        response_data = response.json()
+        # 发送POST请求（异步，按origin复用连接池）
+        response_data = await sbe_client.post(meta.origin, APP_TEMPLATE_SERVICE, request_body)
         if response_data.get("__sys__").get("status") < 0:
             raise AppTemplateApiError(f"API调用失败：{response_data.get("__sys__").get("msg")}")
         logger.info(f"应用模板API：S_BE_LA_18 查询成功，返回模板数量：{len(response_data.get('result', []))}")
         return response_data
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         raise AppTemplateApiError("模板查询API超时，请稍后重试")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise AppTemplateApiError("模板查询API连接失败，请检查网络")
     except Exception as e:
         raise AppTemplateApiError(f"模板查询异常：{str(e)}")
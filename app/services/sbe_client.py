@@ -0,0 +1,83 @@
+import httpx
+import orjson
+from typing import Dict, Any
+
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.metrics import track_upstream
+from app.utils.timing import stage
+
+# 低代码平台S_BE服务路径
+S_BE_SERVICE_PATH = "/code-admin/service/"
+
+# 各S_BE接口超时时间（秒）：查询类接口较短，创建/修改类接口较长，未配置的使用S_BE_DEFAULT_TIMEOUT
+S_BE_ENDPOINT_TIMEOUTS = {
+    "S_BE_LA_18": 15,  # 应用模板查询
+    "S_BE_LV_1101": 15,  # 查询应用内表单
+    "S_BE_LV_10": 15,  # 查询表单视图
+    "S_BE_LA_00": 60,  # 创建应用
+    "S_BE_LA_23": 60,  # 应用模板创建应用
+    "S_BE_LV_41": 60,  # 创建表单
+    "S_BE_LM_168": 60,  # 修改表单
+}
+
+
+class SBEClient:
+    """低代码平台S_BE服务异步客户端：按origin（环境域名）维护独立的keep-alive连接池"""
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=settings.S_BE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.S_BE_MAX_KEEPALIVE,
+            keepalive_expiry=settings.S_BE_KEEPALIVE_EXPIRY
+        )
+        self.timeouts = {**S_BE_ENDPOINT_TIMEOUTS}
+        if settings.S_BE_ENDPOINT_TIMEOUTS:
+            self.timeouts.update(orjson.loads(settings.S_BE_ENDPOINT_TIMEOUTS))
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _get_client(self, origin: str) -> httpx.AsyncClient:
+        """获取origin对应的连接池，首次使用时创建"""
+        origin = origin.rstrip("/")
+        client = self.clients.get(origin)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=origin,
+                limits=self.limits,
+                timeout=settings.S_BE_DEFAULT_TIMEOUT,
+                headers={"Content-Type": "application/json"}
+            )
+            self.clients[origin] = client
+            logger.info(f"创建S_BE连接池：{origin}")
+        return client
+
+    def get_timeout(self, service_id: str) -> float:
+        return self.timeouts.get(service_id, settings.S_BE_DEFAULT_TIMEOUT)
+
+    async def post(self, origin: str, service_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        调用S_BE服务
+        :param origin: 低代码平台环境域名（meta.origin）
+        :param service_id: 服务号，如S_BE_LA_18
+        :param body: 请求体
+        :return: 响应JSON
+        :raises httpx.TimeoutException: 请求超时
+        :raises httpx.ConnectError: 连接失败
+        """
+        with track_upstream("s_be", service_id), stage(f"s_be:{service_id}"):
+            response = await self._get_client(origin).post(
+                S_BE_SERVICE_PATH + service_id,
+                json=body,
+                timeout=self.get_timeout(service_id)
+            )
+            return response.json()
+
+    async def close(self):
+        """关闭所有连接池"""
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+
+# 全局S_BE客户端实例
+sbe_client = SBEClient()
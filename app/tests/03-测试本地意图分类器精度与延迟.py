@@ -0,0 +1,30 @@
+import random
+import sys
+
+from app.services.intent_classifier import IntentClassifier, INTENT_SAMPLES_PATH
+
+# 标注样本（可传入其他JSONL文件，如积累的意图样本日志）
+sample_path = sys.argv[1] if len(sys.argv) > 1 else INTENT_SAMPLES_PATH
+samples = IntentClassifier.load_samples(sample_path)
+random.Random(0).shuffle(samples)
+print('*'*50)
+print("样本文件:", sample_path)
+print("样本数:", len(samples))
+print('*'*50)
+
+# K折交叉验证：每折用其余样本训练，统计各阈值下的覆盖率（本地判定占比）、精度与单次判定延迟
+folds = 5
+for threshold in (0.8, 0.9, 0.95, 0.99, 0.999):
+    accepted = correct = 0
+    latencies = []
+    for fold in range(folds):
+        test = samples[fold::folds]
+        train = [sample for i, sample in enumerate(samples) if i % folds != fold]
+        classifier = IntentClassifier(sample_path="")
+        classifier.train(train)
+        report = classifier.evaluate(test, threshold)
+        accepted += report["coverage"] * report["samples"]
+        correct += report["precision"] * report["coverage"] * report["samples"]
+        latencies.append(report["latency_p99_ms"])
+    print(f"阈值={threshold:.3f}  覆盖率={accepted / len(samples):.1%}  "
+          f"精度={correct / accepted if accepted else 0:.1%}  p99延迟={max(latencies):.3f}ms")
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.utils.singleflight import SingleFlight
+
+# 上游请求：耗时0.2秒，被取消后还需0.05秒收尾（模拟异步关闭连接）
+upstream_calls = []
+
+
+async def upstream(value: str) -> str:
+    upstream_calls.append(value)
+    try:
+        await asyncio.sleep(0.2)
+    except asyncio.CancelledError:
+        await asyncio.sleep(0.05)
+        raise
+    return value
+
+
+async def main():
+    flight = SingleFlight("test")
+    print('*'*50)
+
+    # 1. 并发合并：相同key只发起一次请求
+    results = await asyncio.gather(*(flight.do("k", upstream, "a") for _ in range(5)))
+    print("并发合并：", results, "上游请求数：", len(upstream_calls))
+    assert results == ["a"] * 5 and len(upstream_calls) == 1
+
+    # 2. 取消后加入：唯一的调用方被取消，上游收尾期间新的同key调用应发起新请求并正常返回
+    first = asyncio.create_task(flight.do("k", upstream, "b"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    result = await flight.do("k", upstream, "c")
+    print("取消后加入：", result, "第一个调用已取消：", first.cancelled(), "上游请求数：", len(upstream_calls))
+    assert result == "c" and first.cancelled() and len(upstream_calls) == 3
+
+    # 3. 部分取消：仍有调用方等待时不取消上游请求
+    waiters = [asyncio.create_task(flight.do("k", upstream, "d")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    waiters[0].cancel()
+    result = await waiters[1]
+    print("部分取消：", result, "上游请求数：", len(upstream_calls))
+    assert result == "d" and len(upstream_calls) == 4
+
+    print("统计：", flight.stats())
+    print('*'*50)
+
+
+asyncio.run(main())
@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU + TTL 内存缓存
+    仅在事件循环线程内使用（asyncio单线程），不加锁
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        """
+        :param max_size: 最大条目数，超出后淘汰最久未使用的条目
+        :param ttl: 默认过期时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expire_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，命中则移动到队尾（最近使用）"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expire_at = item
+        if expire_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，超出容量时按LRU淘汰"""
+        expire_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expire_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除指定缓存"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除key满足条件的所有缓存，返回删除条数"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[1] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计"""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,66 @@
+import asyncio
+from typing import AsyncGenerator
+
+from starlette.requests import Request
+
+from app.utils.logger import logger
+from app.utils.metrics import STREAM_CANCELLED
+
+# 流结束标识
+_END = object()
+# 流程任务最多领先响应的帧数（超出后等待发送，保留背压）
+_MAX_BUFFERED_FRAMES = 16
+
+
+class _Failure:
+    """流程执行异常，交给响应任务抛出"""
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def cancel_on_disconnect(request: Request, stream: AsyncGenerator[bytes, None], session_id: str,
+                               endpoint: str) -> AsyncGenerator[bytes, None]:
+    """
+    流式响应断开即取消：流程（stream）在独立任务中执行，响应结束时（正常结束除外）取消流程任务，
+    节点内进行中的call_llm、S_BE请求随之取消
+    - 客户端断开时StreamingResponse自身的断开监听会取消响应任务（不另起任务读取请求消息，避免争抢http.disconnect）；
+      该取消通过anyio取消域传递，不能可靠地取消LangGraph的节点任务，因此流程放在独立任务中、由这里直接cancel
+    - 每帧发送后用request.is_disconnected()补充检查（ASGI 2.4起服务端不再监听断开，只在发送失败时感知）
+    LangGraph按超步写入检查点，被取消节点的部分输出不会写入，会话停留在最近完成的超步，可正常开始下一轮
+    :param request: 当前请求
+    :param stream: 流程的SSE帧生成器
+    :param session_id: 会话ID
+    :param endpoint: 接口名（指标标签）
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_MAX_BUFFERED_FRAMES)
+
+    async def produce():
+        # 被取消时响应任务已不再读取队列，不写入结束标识
+        try:
+            async for frame in stream:
+                await queue.put(frame)
+        except asyncio.CancelledError:
+            STREAM_CANCELLED.inc(endpoint=endpoint)
+            logger.info(f"会话{session_id}：客户端已断开，取消流程执行（{endpoint}）")
+            raise
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+            if await request.is_disconnected():
+                break
+    finally:
+        # 正常结束时producer已完成；客户端断开、响应任务被取消或提前关闭时一并取消流程
+        producer.cancel()
@@ -7,7 +7,8 @@ logger.remove()
 logger.add(
     sys.stdout,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level="INFO",
+    enqueue=settings.LOG_ENQUEUE  # 日志经队列由后台线程写出，不阻塞事件循环
 )
 logger.add(
     "logs/lcai.log",
@@ -15,7 +16,8 @@ logger.add(
     retention="7 days",
     compression="zip",
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level="INFO",
+    enqueue=settings.LOG_ENQUEUE
 )
 
 # 导出logger实例
@@ -0,0 +1,218 @@
+import asyncio
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认耗时分桶（秒）：覆盖本地节点（毫秒级）到LLM长生成（分钟级）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """指标基类：按标签值元组保存样本"""
+    type_ = ""
+
+    def __init__(self, name: str, help_: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], const_labels: str, extra: str = "") -> str:
+        parts = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+        if const_labels:
+            parts.append(const_labels)
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def samples(self, const_labels: str) -> List[str]:
+        raise NotImplementedError
+
+    def render(self, const_labels: str) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}", *self.samples(const_labels)]
+
+
+class Counter(_Metric):
+    """计数器：只增不减"""
+    type_ = "counter"
+
+    def __init__(self, name: str, help_: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self, const_labels: str) -> List[str]:
+        return [f"{self.name}{self._label_text(key, const_labels)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """仪表：可增可减（如进行中的请求数）"""
+    type_ = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """直方图：按分桶统计耗时分布，另记总和与次数"""
+    type_ = "histogram"
+
+    def __init__(self, name: str, help_: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数（非累计）..., 超出最大分桶的计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self, const_labels: str) -> List[str]:
+        lines = []
+        for key, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, const_labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_text(key, const_labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(key, const_labels)} {int(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，按Prometheus文本格式输出
+    仅在事件循环线程内记录（asyncio单线程），不加锁；多worker部署时各进程独立，以worker标签区分
+    """
+
+    def __init__(self, const_labels: Optional[Dict[str, str]] = None):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.const_labels = ",".join(f'{k}="{_escape(v)}"' for k, v in (const_labels or {}).items())
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_, labels))
+
+    def gauge(self, name: str, help_: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_, labels))
+
+    def histogram(self, name: str, help_: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_, labels, buckets))
+
+    def register_collector(self, collector: Callable[[], None]):
+        """注册采集函数：输出前调用，用于把已有组件的统计（如限流器排队数）写入指标"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render(self.const_labels))
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def track(duration: Histogram, errors: Counter, in_flight: Gauge, cancelled: Optional[Counter] = None, **labels):
+    """
+    统计一段代码的耗时、异常次数及进行中数量
+    :param duration: 耗时直方图
+    :param errors: 异常计数器
+    :param in_flight: 进行中数量
+    :param cancelled: 取消计数器（如客户端断开后取消的调用，不计入异常）
+    """
+    in_flight.inc(**labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        if cancelled is not None:
+            cancelled.inc(**labels)
+        raise
+    except BaseException:
+        errors.inc(**labels)
+        raise
+    finally:
+        duration.observe(time.perf_counter() - start, **labels)
+        in_flight.dec(**labels)
+
+
+# 全局指标注册表
+metrics = MetricsRegistry(const_labels={"worker": str(os.getpid())})
+
+# 图节点
+NODE_DURATION = metrics.histogram("lcai_node_duration_seconds", "LangGraph节点耗时", ["node"])
+NODE_ERRORS = metrics.counter("lcai_node_errors_total", "LangGraph节点异常次数", ["node"])
+NODE_IN_FLIGHT = metrics.gauge("lcai_node_in_flight", "执行中的LangGraph节点数", ["node"])
+NODE_INTERRUPTS = metrics.counter("lcai_node_interrupts_total", "LangGraph节点中断（等待用户输入）次数", ["node"])
+NODE_CANCELLED = metrics.counter("lcai_node_cancelled_total", "LangGraph节点被取消（客户端断开）次数", ["node"])
+# 智能体（按DS平台API Key区分）的LLM调用
+LLM_DURATION = metrics.histogram("lcai_llm_duration_seconds", "智能体LLM调用耗时（流式为完整读取耗时）", ["agent", "stream"])
+LLM_ERRORS = metrics.counter("lcai_llm_errors_total", "智能体LLM调用异常次数", ["agent", "stream"])
+LLM_IN_FLIGHT = metrics.gauge("lcai_llm_in_flight", "进行中的智能体LLM调用数", ["agent", "stream"])
+LLM_CANCELLED = metrics.counter("lcai_llm_cancelled_total", "智能体LLM调用被取消次数", ["agent", "stream"])
+LLM_TOKENS = metrics.counter("lcai_llm_tokens_total", "智能体LLM token用量（取自响应usage）", ["agent", "type"])
+# 上游接口（DS平台、S_BE、表单保存）
+UPSTREAM_DURATION = metrics.histogram("lcai_upstream_duration_seconds", "上游接口单次请求耗时", ["upstream", "endpoint"])
+UPSTREAM_ERRORS = metrics.counter("lcai_upstream_errors_total", "上游接口请求异常次数", ["upstream", "endpoint"])
+UPSTREAM_IN_FLIGHT = metrics.gauge("lcai_upstream_in_flight", "进行中的上游接口请求数", ["upstream", "endpoint"])
+UPSTREAM_CANCELLED = metrics.counter("lcai_upstream_cancelled_total", "上游接口请求被取消次数", ["upstream", "endpoint"])
+# 流式接口（/stream、/confirm）
+STREAM_CANCELLED = metrics.counter("lcai_stream_cancelled_total", "客户端断开后取消的流程执行次数", ["endpoint"])
+# DS平台按API Key限流（输出时从限流器读取）
+LLM_QUEUE_WAITING = metrics.gauge("lcai_llm_queue_waiting", "DS平台限流排队中的请求数", ["agent"])
+LLM_QUEUE_REJECTED = metrics.gauge("lcai_llm_queue_rejected", "DS平台限流排队超时的累计请求数", ["agent"])
+
+
+def track_llm(agent: str, stream: str):
+    """统计一次智能体LLM调用（耗时、异常、取消、进行中数量）"""
+    return track(LLM_DURATION, LLM_ERRORS, LLM_IN_FLIGHT, LLM_CANCELLED, agent=agent, stream=stream)
+
+
+def track_upstream(upstream: str, endpoint: str):
+    """统计一次上游接口请求（耗时、异常、取消、进行中数量）"""
+    return track(UPSTREAM_DURATION, UPSTREAM_ERRORS, UPSTREAM_IN_FLIGHT, UPSTREAM_CANCELLED,
+                 upstream=upstream, endpoint=endpoint)
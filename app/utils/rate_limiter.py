@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶：按每分钟速率匀速补充，容量默认为一分钟的配额
+    等待方按先来后到排队（asyncio.Lock为FIFO）
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """取出amount个令牌，不足时排队等待"""
+        amount = min(amount, self.capacity)  # 单次请求超过容量时按满桶处理，避免永久等待
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """按实际用量修正（delta>0补扣，delta<0归还），允许透支为负"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class KeyLimiter:
+    """单个API Key的限流器：并发信号量 + 每分钟请求数/token数令牌桶"""
+
+    def __init__(self, name: str, max_concurrency: int = 0, rpm: int = 0, tpm: int = 0,
+                 queue_timeout: float = 0):
+        """
+        :param name: 限流器名称（用于日志、监控，不含密钥）
+        :param max_concurrency: 最大并发数，0为不限
+        :param rpm: 每分钟请求数，0为不限
+        :param tpm: 每分钟token数，0为不限
+        :param queue_timeout: 最长排队时间（秒），0为不限
+        """
+        self.name = name
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        self.queue_timeout = queue_timeout
+        # 监控指标
+        self.waiting = 0
+        self.in_flight = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def _wait_turn(self, estimated_tokens: int):
+        if self.semaphore is not None:
+            await self.semaphore.acquire()
+        try:
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None:
+                await self.token_bucket.acquire(estimated_tokens)
+        except BaseException:
+            if self.semaphore is not None:
+                self.semaphore.release()
+            raise
+
+    async def acquire(self, estimated_tokens: int = 0) -> float:
+        """
+        排队获取调用许可，成功后必须调用release
+        :param estimated_tokens: 预估token数（调用结束后按实际用量修正）
+        :return: 排队等待时间（秒）
+        :raises asyncio.TimeoutError: 排队超时
+        """
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._wait_turn(estimated_tokens), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self.acquired += 1
+        self.in_flight += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        """
+        释放调用许可
+        :param estimated_tokens: acquire时的预估token数
+        :param actual_tokens: 实际消耗token数（未知时不修正）
+        """
+        self.in_flight -= 1
+        if self.semaphore is not None:
+            self.semaphore.release()
+        if self.token_bucket is not None and actual_tokens is not None:
+            self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def stats(self) -> Dict[str, float]:
+        """排队与并发指标"""
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait": self.max_wait,
+        }
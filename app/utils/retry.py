@@ -0,0 +1,41 @@
+import random
+
+
+class RetryBudget:
+    """
+    重试预算：每个请求存入ratio个额度，每次重试/对冲消耗1个额度
+    额度耗尽后不再重试，保证上游故障时重试流量不超过正常流量的ratio比例
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 10):
+        """
+        :param ratio: 每个请求存入的额度（即允许的重试比例）
+        :param reserve: 额度上限，也是启动时的初始额度
+        """
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+        self.withdrawn = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        """新请求存入额度"""
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """尝试消耗一次重试额度，额度不足返回False"""
+        if self.balance >= 1:
+            self.balance -= 1
+            self.withdrawn += 1
+            return True
+        self.exhausted += 1
+        return False
+
+
+def backoff_delay(attempt: int, base: float = 0.5, max_delay: float = 5.0) -> float:
+    """
+    指数退避 + 全抖动（full jitter）
+    :param attempt: 第几次重试（从1开始）
+    :return: 本次等待时间（秒）
+    """
+    return random.uniform(0, min(max_delay, base * (2 ** (attempt - 1))))
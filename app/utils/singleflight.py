@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    """一次进行中的上游调用"""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    并发请求合并：相同key的并发调用只发起一次上游请求，所有调用方共享同一结果
+    注意：共享结果对所有调用方是同一个对象，调用方应视为只读
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0  # 实际发起的上游请求数
+        self.coalesced = 0  # 被合并（搭便车）的调用数
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        执行调用：key相同的调用正在进行时直接等待其结果
+        单个调用方被取消不影响其他调用方；所有调用方都取消后才取消上游请求
+        :param key: 请求标识
+        :param fn: 实际发起请求的协程函数
+        :return: 上游调用结果
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn(*args, **kwargs)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 先移除再取消：上游协程收尾期间（如异步关闭连接）新的同key调用应发起新请求，而不是等到已取消的任务
+                self._forget(key, call)
+                call.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """合并统计"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
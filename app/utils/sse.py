@@ -0,0 +1,97 @@
+import itertools
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+from pydantic import BaseModel
+
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.timing import stage
+
+# SSE帧外壳
+_PREFIX = b"data: "
+_SUFFIX = b"\n\n"
+# 节点输出中不下发给前端的字段（消息历史、任务计划由前端按帧自行拼接）
+_HIDDEN_KEYS = frozenset(("messages", "execution_plan"))
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """orjson不支持的类型：Pydantic模型（含LangChain消息）转为dict，其余转为字符串"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return str(obj)
+
+
+class SSEEncoder:
+    """
+    SSE帧编码（/stream与/confirm共用）：orjson直接编码为bytes，帧外壳与结束帧预先编码，
+    时间戳按秒缓存，帧日志按间隔抽样并截断（日志由后台线程写出，不阻塞事件循环）
+    """
+
+    def __init__(self, log_sample_every: int = 50, log_max_chars: int = 300):
+        """
+        :param log_sample_every: 每隔多少帧记录一帧日志（0表示不记录）
+        :param log_max_chars: 单条帧日志最多保留的字符数
+        """
+        self.log_sample_every = log_sample_every
+        self.log_max_chars = log_max_chars
+        self._frame_counter = itertools.count()
+        # (秒, 格式化后的时间)
+        self._tick = (0, "")
+        self.end_frame_bytes = self.encode({"type": "end", "msg": "", "finished": True})
+
+    def now(self) -> str:
+        """当前时间（同一秒内复用格式化结果）"""
+        second = int(time.time())
+        tick = self._tick
+        if tick[0] != second:
+            tick = self._tick = (second, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second)))
+        return tick[1]
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        """编码一帧SSE消息（开启阶段耗时时计入serialize:sse）"""
+        with stage("serialize:sse"):
+            return _PREFIX + orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS) + _SUFFIX
+
+    def node_frame(self, node_name: str, node_data: Dict[str, Any]) -> bytes:
+        """节点输出帧：去掉消息历史与任务计划，补充节点名与时间"""
+        frame = {key: value for key, value in node_data.items() if key not in _HIDDEN_KEYS}
+        frame.setdefault("node", node_name)
+        frame["time"] = self.now()
+        return self.encode(frame)
+
+    def interrupt_frame(self, session_id: str, data: Dict[str, Any]) -> bytes:
+        """中断帧：流程暂停，等待用户通过/confirm继续"""
+        return self.encode({
+            "type": "interrupt",
+            "node": "__interrupt__",
+            "time": self.now(),
+            "pause_info": {
+                **data,
+                "session_id": session_id,
+                "sysMsg": "流程已暂停，请通过 /lcai/confirm 接口继续"
+            },
+            "finished": False
+        })
+
+    def end_frame(self, timing: Optional[Dict[str, Any]] = None) -> bytes:
+        """结束帧（附带阶段耗时时才重新编码）"""
+        if timing is None:
+            return self.end_frame_bytes
+        return self.encode({"type": "end", "msg": "", "finished": True, "timing": timing})
+
+    def log_frame(self, session_id: str, node_name: str, frame: bytes) -> None:
+        """抽样记录节点输出帧（截断，避免整份表单JSON写入日志）"""
+        if self.log_sample_every <= 0 or next(self._frame_counter) % self.log_sample_every:
+            return
+        text = frame[len(_PREFIX):len(_PREFIX) + self.log_max_chars * 4].decode("utf-8", errors="ignore")
+        logger.info(f"会话{session_id}：节点【{node_name}】输出（抽样）：{text[:self.log_max_chars]}")
+
+
+# 全局实例
+sse_encoder = SSEEncoder(
+    log_sample_every=settings.SSE_LOG_SAMPLE_EVERY,
+    log_max_chars=settings.SSE_LOG_MAX_CHARS
+)
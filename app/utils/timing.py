@@ -0,0 +1,107 @@
+import asyncio
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Server-Timing指标名只允许token字符
+_SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class StageTimer:
+    """
+    请求级阶段耗时：记录一次请求内各节点、上游调用、排队、序列化的耗时
+    通过contextvars随请求传递（asyncio任务及to_thread创建时复制上下文，共用同一个StageTimer）
+    """
+
+    def __init__(self, max_spans: int = 500):
+        """
+        :param max_spans: 最多保留的明细条数（超出后只累计汇总）
+        """
+        self.start = time.perf_counter()
+        self.max_spans = max_spans
+        # 阶段名 -> [次数, 总耗时（秒）]
+        self.totals: Dict[str, List[float]] = {}
+        # 明细：(阶段名, 相对请求开始的开始时间（秒）, 耗时（秒）, 执行者（asyncio任务名或线程名）)
+        self.spans: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration: float, start: Optional[float] = None) -> None:
+        """
+        记录一个阶段
+        :param name: 阶段名，如 node:planner_agent、ds:chat/completions、queue:ds、serialize:sse
+        :param duration: 耗时（秒）
+        :param start: 阶段开始时的perf_counter值（默认按结束时间倒推）
+        """
+        if start is None:
+            start = time.perf_counter() - duration
+        with self._lock:
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = [0, 0.0]
+            total[0] += 1
+            total[1] += duration
+            if len(self.spans) < self.max_spans:
+                self.spans.append((name, start - self.start, duration, _lane()))
+
+    def summary(self) -> Dict[str, Any]:
+        """耗时汇总（毫秒），附加到流式响应的end帧"""
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+                "stages": {name: {"count": int(count), "total_ms": round(total * 1000, 2)}
+                           for name, (count, total) in self.totals.items()},
+                "spans": [{"name": name, "start_ms": round(start * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+                          for name, start, duration, _ in self.spans],
+            }
+
+    def server_timing(self) -> str:
+        """按阶段汇总生成Server-Timing响应头"""
+        with self._lock:
+            items = [(name, total) for name, (_, total) in self.totals.items()]
+        items.append(("total", time.perf_counter() - self.start))
+        return ", ".join(f'{_SERVER_TIMING_NAME.sub("_", name)};dur={total * 1000:.1f};desc="{name}"'
+                         for name, total in items)
+
+
+def _lane() -> str:
+    """当前执行者：asyncio任务名（并发的节点、上游调用各占一行），线程池中为线程名"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task.get_name() if task is not None else threading.current_thread().name
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("stage_timer", default=None)
+
+
+def use_timer(timer: Optional[StageTimer]) -> None:
+    """
+    将阶段耗时记录绑定到当前上下文，此后创建的任务、线程均记入该记录
+    :param timer: 请求的阶段耗时记录（None表示不记录）
+    """
+    _current_timer.set(timer)
+
+
+def record_stage(name: str, duration: float, start: Optional[float] = None) -> None:
+    """记录一个阶段（当前请求未开启时忽略）"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, duration, start)
+
+
+@contextmanager
+def stage(name: str):
+    """统计一段代码的耗时，记入当前请求（未开启时不计时）"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start, start)
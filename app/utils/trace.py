@@ -0,0 +1,150 @@
+import asyncio
+import glob
+import os
+import re
+import time
+import zlib
+from typing import Any, AsyncGenerator, Dict, Optional
+
+import orjson
+
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.timing import StageTimer
+
+# 文件名中会话ID只保留安全字符
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+
+
+class TraceExporter:
+    """
+    执行轨迹导出：按会话抽样记录一次请求内的节点、并发的上游调用、序列化、SSE帧输出及事件循环阻塞，
+    写成Chrome trace-event JSON（chrome://tracing、Perfetto可直接打开），目录内文件数有上限
+    轨迹明细复用请求级阶段耗时记录（StageTimer），未抽中的请求不产生任何开销
+    """
+
+    def __init__(self, directory: str = "data/traces", sample_rate: float = 0.0, max_files: int = 200,
+                 max_events: int = 5000, loop_lag_threshold: float = 0.02):
+        """
+        :param directory: 轨迹文件目录
+        :param sample_rate: 会话抽样比例（0~1），按会话ID哈希抽样，同一会话的/stream与/confirm同时抽中
+        :param max_files: 目录内最多保留的轨迹文件数（超出删除最早的）
+        :param max_events: 单次请求最多记录的事件数
+        :param loop_lag_threshold: 事件循环阻塞超过该值（秒）时记入轨迹
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_events = max_events
+        self.loop_lag_threshold = loop_lag_threshold
+
+    def sampled(self, session_id: str) -> bool:
+        """会话是否抽中"""
+        if self.sample_rate <= 0:
+            return False
+        return zlib.crc32(session_id.encode("utf-8")) % 10000 < self.sample_rate * 10000
+
+    def new_timer(self) -> StageTimer:
+        """创建记录轨迹用的阶段耗时记录（明细条数上限按max_events）"""
+        return StageTimer(max_spans=self.max_events)
+
+    async def _monitor_loop(self, timer: StageTimer):
+        """定时休眠，实际唤醒晚于预期的部分即事件循环被阻塞的时间"""
+        interval = self.loop_lag_threshold
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = time.perf_counter() - start - interval
+            if lag > self.loop_lag_threshold:
+                timer.add("loop:lag", lag, start + interval)
+
+    def start(self, timer: StageTimer) -> asyncio.Task:
+        """开始监测事件循环阻塞，返回监测任务（finish时取消）"""
+        return asyncio.create_task(self._monitor_loop(timer), name="event-loop-monitor")
+
+    def to_chrome_trace(self, timer: StageTimer, session_id: str, endpoint: str) -> Dict[str, Any]:
+        """
+        转为Chrome trace-event格式：每个阶段一个完整事件（ph=X），同一asyncio任务/线程的事件在同一行
+        :return: trace JSON对象
+        """
+        pid = os.getpid()
+        lanes: Dict[str, int] = {}
+        events = [{"ph": "M", "name": "process_name", "pid": pid, "tid": 0,
+                   "args": {"name": f"lcai {endpoint} {session_id}"}}]
+        for name, start, duration, lane in list(timer.spans):
+            tid = lanes.get(lane)
+            if tid is None:
+                tid = lanes[lane] = len(lanes) + 1
+                events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": lane}})
+            events.append({
+                "name": name,
+                "cat": name.split(":", 1)[0],
+                "ph": "X",
+                "ts": round(start * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": pid,
+                "tid": tid
+            })
+        summary = timer.summary()
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"session_id": session_id, "endpoint": endpoint,
+                          "total_ms": summary["total_ms"], "stages": summary["stages"]}
+        }
+
+    def _prune(self):
+        """删除超出数量上限的最早的轨迹文件"""
+        files = glob.glob(os.path.join(self.directory, "*.json"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # 其他worker已删除
+
+    def export(self, timer: StageTimer, session_id: str, endpoint: str) -> str:
+        """
+        写入轨迹文件
+        :return: 文件路径
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{_UNSAFE_NAME.sub('_', session_id)[:64]}"
+                     f"-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}.json")
+        path = os.path.join(self.directory, file_name)
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(self.to_chrome_trace(timer, session_id, endpoint)))
+        self._prune()
+        return path
+
+    async def finish(self, timer: StageTimer, monitor: asyncio.Task, session_id: str, endpoint: str):
+        """停止监测并在线程池中写入轨迹文件（写入失败只记录日志）"""
+        monitor.cancel()
+        try:
+            path = await asyncio.to_thread(self.export, timer, session_id, endpoint)
+            logger.info(f"会话{session_id}：执行轨迹已写入{path}")
+        except Exception as e:
+            logger.warning(f"会话{session_id}：执行轨迹写入失败：{str(e)}")
+
+    async def wrap_stream(self, stream: AsyncGenerator[bytes, None], timer: StageTimer, session_id: str,
+                          endpoint: str) -> AsyncGenerator[bytes, None]:
+        """包装流式响应：流开始时开始监测，流结束（含异常、客户端断开）时写入轨迹"""
+        monitor = self.start(timer)
+        try:
+            async for frame in stream:
+                yield frame
+        finally:
+            await stream.aclose()
+            await self.finish(timer, monitor, session_id, endpoint)
+
+
+# 全局实例
+trace_exporter = TraceExporter(
+    directory=settings.TRACE_DIR,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    max_files=settings.TRACE_MAX_FILES,
+    max_events=settings.TRACE_MAX_EVENTS,
+    loop_lag_threshold=settings.TRACE_LOOP_LAG_THRESHOLD
+)